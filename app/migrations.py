@@ -0,0 +1,33 @@
+# app/migrations.py
+from sqlalchemy import text
+
+# =========================
+# 🧱 MISES À NIVEAU DU SCHÉMA
+# =========================
+# create_all crée les tables manquantes mais ne modifie jamais une table
+# existante : colonnes et index ajoutés après coup sont appliqués ici.
+# Chaque instruction est idempotente (IF NOT EXISTS) et rejouée à chaque
+# démarrage.
+
+SCHEMA_UPGRADES = [
+    # 🔑 Pagination keyset des dépôts
+    "CREATE INDEX IF NOT EXISTS ix_deposits_created_at_id ON deposits (created_at, id)",
+    # 📒 Historique par utilisateur
+    "CREATE INDEX IF NOT EXISTS ix_deposits_user_id_created_at ON deposits (user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_withdrawals_user_id_created_at ON withdrawals (user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_transaction_history_user_id_created_at "
+    "ON transaction_history (user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_transaction_history_admin_credits "
+    "ON transaction_history (user_id, created_at) WHERE transaction_id LIKE 'ADMIN-CREDIT-%'",
+    # 💸 File de retraits (SKIP LOCKED)
+    "ALTER TABLE withdrawals ADD COLUMN IF NOT EXISTS claimed_by VARCHAR",
+    "ALTER TABLE withdrawals ADD COLUMN IF NOT EXISTS claimed_until TIMESTAMPTZ",
+    "CREATE INDEX IF NOT EXISTS ix_withdrawals_pending_created_at "
+    "ON withdrawals (created_at) WHERE status = 'pending'",
+]
+
+
+async def upgrade_schema(conn):
+    """Applique SCHEMA_UPGRADES sur une connexion ouverte (engine.begin())."""
+    for statement in SCHEMA_UPGRADES:
+        await conn.execute(text(statement))
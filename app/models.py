@@ -1,7 +1,8 @@
 from sqlalchemy import (
-    Column, Integer, String, Numeric, DateTime, Boolean, Date, ForeignKey, Float
+    Column, Integer, String, Numeric, DateTime, Boolean, Date, ForeignKey, Float, Index,
+    UniqueConstraint
 )
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -94,6 +95,13 @@ class Deposit(Base):
     user = relationship("User", back_populates="deposits")
     transaction_method = relationship("TransactionMethod", back_populates="deposits")
 
+    __table_args__ = (
+        # 🔑 Pagination keyset sur (created_at, id)
+        Index("ix_deposits_created_at_id", "created_at", "id"),
+        # 📒 Historique par utilisateur
+        Index("ix_deposits_user_id_created_at", "user_id", "created_at"),
+    )
+
 # ===============================
 # Retraits utilisateurs
 # ===============================
@@ -107,10 +115,24 @@ class Withdrawal(Base):
     amount = Column(Numeric(10, 2), nullable=False)
     status = Column(String, default="pending")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # 🔒 Réservation par un validateur (file de traitement)
+    claimed_by = Column(String, nullable=True)
+    claimed_until = Column(DateTime(timezone=True), nullable=True)
 
     user = relationship("User", back_populates="withdrawals")
     transaction_method = relationship("TransactionMethod", back_populates="withdrawals")
 
+    __table_args__ = (
+        # ⚡ Index partiel : seuls les retraits en attente, triés par ancienneté
+        Index(
+            "ix_withdrawals_pending_created_at",
+            "created_at",
+            postgresql_where=text("status = 'pending'"),
+        ),
+        # 📒 Historique par utilisateur
+        Index("ix_withdrawals_user_id_created_at", "user_id", "created_at"),
+    )
+
 # ===============================
 # Wallet utilisateur
 # ===============================
@@ -144,6 +166,18 @@ class TransactionHistory(Base):
     user = relationship("User", back_populates="history")
     transaction_method = relationship("TransactionMethod", back_populates="history")
 
+    __table_args__ = (
+        # 📒 Historique par utilisateur
+        Index("ix_transaction_history_user_id_created_at", "user_id", "created_at"),
+        # ⚡ Index partiel : crédits manuels admin (branche "credit" du grand livre)
+        Index(
+            "ix_transaction_history_admin_credits",
+            "user_id",
+            "created_at",
+            postgresql_where=text("transaction_id LIKE 'ADMIN-CREDIT-%'"),
+        ),
+    )
+
 
 class RealCash(Base):
     __tablename__ = "real_cash"  # nom différent pour éviter conflit
@@ -154,4 +188,24 @@ class RealCash(Base):
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
-    user = relationship("User", backref="real_cash")
\ No newline at end of file
+    user = relationship("User", backref="real_cash")
+
+
+# ===============================
+# Statistiques journalières (agrégats)
+# ===============================
+class DailyStat(Base):
+    __tablename__ = "daily_stats"
+
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    kind = Column(String(20), nullable=False)                 # "deposit" / "withdrawal"
+    method_id = Column(Integer, nullable=False, default=0)    # 0 = méthode inconnue
+    country = Column(String, nullable=False, default="")      # "" = pays inconnu
+    status = Column(String, nullable=False)                   # "approved" / "rejected"
+    count = Column(Integer, nullable=False, default=0)
+    total_amount = Column(Numeric(14, 2), nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("day", "kind", "method_id", "country", "status", name="uq_daily_stats_key"),
+    )
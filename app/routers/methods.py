@@ -1,23 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
 from app.database import get_db
-from app.models import TransactionMethod
+from app.services.method_catalog import (
+    MethodCatalog,
+    get_method_catalog,
+    invalidate_catalog,
+    load_catalog,
+)
+from app.utils.http_cache import conditional_json_response, render_json
 
 router = APIRouter(prefix="/transaction-methods", tags=["Transaction Methods"])
 
 @router.get("/")
-async def list_transaction_methods(db: AsyncSession = Depends(get_db)):
+async def list_transaction_methods(request: Request, catalog: MethodCatalog = Depends(get_method_catalog)):
     """Retourne la liste de toutes les méthodes disponibles"""
-    result = await db.execute(select(TransactionMethod))
-    methods = result.scalars().all()
-    return methods
+    return conditional_json_response(
+        request,
+        catalog.etag("transaction-methods"),
+        lambda: catalog.render(
+            "transaction-methods",
+            lambda: render_json([method.as_dict() for method in catalog.methods]),
+        ),
+    )
+
+@router.post("/refresh")
+async def refresh_transaction_methods(db: AsyncSession = Depends(get_db)):
+    """Recharge le catalogue en mémoire (après modification des méthodes)"""
+    invalidate_catalog()
+    catalog = await load_catalog(db)
+    return {"message": "Catalogue rechargé", "version": catalog.version, "count": len(catalog.methods)}
 
 @router.get("/{method_id}")
-async def get_transaction_method(method_id: int, db: AsyncSession = Depends(get_db)):
+async def get_transaction_method(method_id: int, request: Request, catalog: MethodCatalog = Depends(get_method_catalog)):
     """Retourne les détails d'une méthode spécifique (ex: MTN Benin)"""
-    result = await db.execute(select(TransactionMethod).where(TransactionMethod.id == method_id))
-    method = result.scalars().first()
+    method = catalog.get(method_id)
     if not method:
         raise HTTPException(status_code=404, detail="Méthode introuvable")
-    return method
+
+    name = f"transaction-method-{method_id}"
+    return conditional_json_response(
+        request,
+        catalog.etag(name),
+        lambda: catalog.render(name, lambda: render_json(method.as_dict())),
+    )
@@ -1,11 +1,9 @@
 # app/routers/withdraw_methods.py
-from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, Request
 from typing import List
 from pydantic import BaseModel
-from app.models import TransactionMethod
-from app.database import get_db
+from app.services.method_catalog import MethodCatalog, get_method_catalog
+from app.utils.http_cache import conditional_json_response, render_json
 
 router = APIRouter(
     prefix="/withdraw-methods",
@@ -23,30 +21,23 @@ class WithdrawMethodResponse(BaseModel):
         from_attributes = True  # Pydantic v2 : remplace orm_mode
 
 # 🚀 Route principale : liste les méthodes de retrait
-@router.get("/", response_model=List[WithdrawMethodResponse])
-async def get_withdraw_methods(session: AsyncSession = Depends(get_db)):
+@router.get("/", responses={200: {"model": List[WithdrawMethodResponse]}})
+async def get_withdraw_methods(request: Request, catalog: MethodCatalog = Depends(get_method_catalog)):
     """
     Retourne la liste des méthodes de retrait disponibles :
     - id
     - nom
     - icône
     - pays
+
+    Réponse mise en cache côté client : ETag dérivé de la version du
+    catalogue, 304 si If-None-Match correspond.
     """
-    query = (
-        select(
-            TransactionMethod.id,
-            TransactionMethod.name,
-            TransactionMethod.icon_url,
-            TransactionMethod.country
-        )
-        .where(TransactionMethod.type == "withdrawal")
+    return conditional_json_response(
+        request,
+        catalog.etag("withdraw-methods"),
+        lambda: catalog.render("withdraw-methods", lambda: render_json([
+            {"id": m.id, "name": m.name, "icon_url": m.icon_url, "country": m.country}
+            for m in catalog.of_type("withdrawal")
+        ])),
     )
-
-    result = await session.execute(query)
-    methods = result.all()
-
-    # Convertit [(id, name, icon_url, country)] → [{...}, {...}]
-    return [
-        {"id": id_, "name": name, "icon_url": icon_url, "country": country}
-        for id_, name, icon_url, country in methods
-    ]
@@ -0,0 +1,110 @@
+from datetime import date, datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.services.admission import admission_stats
+from app.services.cache import all_cache_stats
+from app.services.circuit_breaker import all_breakers
+from app.services.export import EXPORT_TABLES, stream_export
+from app.services.method_catalog import MethodCatalog, get_method_catalog
+from app.services.stats import STAT_DIMENSIONS, query_daily_stats, rebuild_daily_stats
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+# ============================================================
+# 🔹 Export comptable (CSV / NDJSON, gzip en option)
+# ============================================================
+@router.get("/exports/{dataset}")
+async def export_dataset(
+    dataset: str,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    status: Optional[str] = None,
+):
+    """
+    Exporte `transaction_history`, `deposits` ou `withdrawals` sur la
+    période [start, end[ en flux continu, sans charger la table en mémoire.
+    """
+    if dataset not in EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail="Export inconnu")
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"{dataset}.{format}"
+    headers = {}
+    if gzip:
+        media_type = "application/gzip"
+        filename += ".gz"
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    return StreamingResponse(
+        stream_export(dataset, format, start, end, status, compress=gzip),
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+# ============================================================
+# 🔹 Statistiques (depuis les agrégats journaliers)
+# ============================================================
+@router.get("/stats")
+async def get_stats(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    kind: Optional[str] = Query(None, pattern="^(deposit|withdrawal)$"),
+    group_by: List[str] = Query(["day", "kind", "status"]),
+    db: AsyncSession = Depends(get_db),
+    catalog: MethodCatalog = Depends(get_method_catalog),
+):
+    """
+    Totaux déposés/retirés sur [start, end], regroupés selon `group_by`
+    (day, kind, method_id, country, status). Lit uniquement `daily_stats`.
+    """
+    unknown = [name for name in group_by if name not in STAT_DIMENSIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Regroupement inconnu : {', '.join(unknown)}")
+
+    rows = await query_daily_stats(db, start, end, tuple(group_by), kind)
+
+    if "method_id" in group_by:
+        for row in rows:
+            row["method_name"] = catalog.name_of(row["method_id"]) or "Inconnue"
+
+    return rows
+
+
+@router.post("/stats/rebuild")
+async def rebuild_stats(db: AsyncSession = Depends(get_db)):
+    """Reconstruit `daily_stats` depuis les dépôts et retraits."""
+    count = await rebuild_daily_stats(db)
+    return {"message": "✅ Statistiques reconstruites", "rows": count}
+
+
+# ============================================================
+# 🔹 Caches mémoire (taux de succès, évictions, taille)
+# ============================================================
+@router.get("/cache")
+async def get_cache_stats():
+    return await all_cache_stats()
+
+
+# ============================================================
+# 🔹 État des fournisseurs IA / recherche (disjoncteurs)
+# ============================================================
+@router.get("/providers")
+async def get_providers_health():
+    return all_breakers()
+
+
+# ============================================================
+# 🔹 Contrôle d'admission (files d'attente, quotas clients)
+# ============================================================
+@router.get("/admission")
+async def get_admission_stats():
+    return admission_stats()
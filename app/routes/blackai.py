@@ -1,14 +1,42 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
+import asyncio
+import json
+import math
+import os
 import random
 import re
+import time
+from collections import OrderedDict
 
 from app.services.search import search_web
-from app.services.ai import generate_answer
-from app.services.cache import get_cache, set_cache
+from app.services.ai import FALLBACK_ANSWER, generate_answer, llm_available, stream_answer
+from app.services.admission import Busy, client_address, client_limiter
+from app.services.cache import get_cache_entry, set_cache
+from app.services.singleflight import SingleFlight
+from app.services.near_dup import NearDuplicateIndex
+from app.services.context import NO_RESULTS, NOT_ENOUGH, build_context
+from app.services.deadline import SEARCH_MAX_SECONDS, SEARCH_SHARE, start_deadline, within
+from app.services.faq import search_faq, direct_answer, is_local_enough, format_passages
 
 router = APIRouter()
 
+# 🛫 Questions identiques simultanées → un seul appel search + IA
+inflight = SingleFlight()
+
+# 🔁 Reformulations d'une question déjà en cache → même réponse
+near_duplicates = NearDuplicateIndex()
+
+# ♻️ Rafraîchissements en arrière-plan (références gardées jusqu'à la fin)
+refreshing = set()
+
+# ♻️ Dernière tentative de rafraîchissement par clé : (instant, échecs consécutifs)
+REFRESH_BACKOFF = float(os.getenv("BLACKAI_REFRESH_BACKOFF", 60))
+REFRESH_MAX_BACKOFF = float(os.getenv("BLACKAI_REFRESH_MAX_BACKOFF", 3600))
+REFRESH_MAX_TRACKED = 10000
+refresh_attempts = OrderedDict()
+
 
 class Question(BaseModel):
     question: str
@@ -72,40 +100,174 @@ def get_special_response(question: str) -> str | None:
 
 
 # =========================
-# 🔎 FILTER SEARCH
+# 💾 CACHE (exact puis quasi identique)
 # =========================
-def filter_search_results(search_data: dict, max_chars: int = 2000) -> str:
-    if not search_data or "results" not in search_data:
-        return "Aucune information pertinente trouvée."
+# Une entrée garde la question d'origine avec la réponse : c'est elle
+# qui sert au rafraîchissement (pas la reformulation qui l'a trouvée).
+async def lookup_cache(question: str, normalized_q: str, client: str):
+    entry = await get_cache_entry(normalized_q)
+    if entry:
+        near_duplicates.add(normalized_q, question)
+        key = normalized_q
+    else:
+        key = near_duplicates.find(question)
+        entry = await get_cache_entry(key) if key else None
+        if not entry:
+            return None
+
+    value, stale = entry
+    if isinstance(value, str):
+        # Entrée écrite avant l'ajout de la question d'origine
+        value = {"question": question if key == normalized_q else None, "answer": value}
+
+    if stale and value["question"]:
+        # ♻️ Réponse périmée : servie tout de suite, rafraîchie en arrière-plan
+        refresh_in_background(value["question"], key, client)
+    return value["answer"]
+
+
+async def save_answer(question: str, normalized_q: str, answer: str):
+    await set_cache(normalized_q, {"question": question, "answer": answer})
+    near_duplicates.add(normalized_q, question)
+
+
+def refresh_due(cache_key: str) -> bool:
+    """False si un rafraîchissement de cette clé a échoué récemment (backoff exponentiel)."""
+    attempt = refresh_attempts.get(cache_key)
+    if attempt is None:
+        return True
+    attempted_at, failures = attempt
+    delay = min(REFRESH_MAX_BACKOFF, REFRESH_BACKOFF * 2 ** max(0, failures - 1))
+    return time.monotonic() - attempted_at >= delay
+
+
+def record_refresh(cache_key: str, succeeded: bool):
+    if succeeded:
+        refresh_attempts.pop(cache_key, None)
+        return
+    _, failures = refresh_attempts.pop(cache_key, (0.0, 0))
+    refresh_attempts[cache_key] = (time.monotonic(), failures + 1)
+    while len(refresh_attempts) > REFRESH_MAX_TRACKED:
+        refresh_attempts.popitem(last=False)
+
+
+def refresh_in_background(question: str, cache_key: str, client: str):
+    # Déjà en cours (rafraîchissement ou requête live) : single-flight le regroupe
+    if inflight.pending(cache_key) or not refresh_due(cache_key):
+        return
+    # IA en panne ou saturée : on garde la réponse périmée, sans charger les fournisseurs
+    if not llm_available():
+        return
+    # 🪣 Le rafraîchissement consomme un jeton du client qui l'a déclenché
+    if client_limiter.check(client):
+        return
+
+    async def refresh():
+        start_deadline()
+        source = "error"
+        try:
+            source, _ = await inflight.do(
+                cache_key, lambda: answer_question(question, cache_key, search_faq(question))
+            )
+        except Exception as e:
+            print(f"❌ Rafraîchissement {cache_key}:", e)
+        record_refresh(cache_key, source == "live")
+        if source == "live":
+            print(f"♻️ Cache rafraîchi → {cache_key}")
+
+    # Marqué tout de suite : les requêtes suivantes ne relancent rien
+    refresh_attempts[cache_key] = (time.monotonic(), refresh_attempts.get(cache_key, (0.0, 0))[1])
+    task = asyncio.create_task(refresh())
+    refreshing.add(task)
+    task.add_done_callback(refreshing.discard)
 
-    parts = []
-    total = 0
 
-    for r in search_data["results"]:
-        title = r.get("title", "")
-        content = r.get("content") or r.get("snippet", "")
+# =========================
+# 🧠 PROMPT
+# =========================
+async def gather_context(question: str, faq_matches: list = ()) -> str:
+    local = format_passages(faq_matches) if faq_matches else ""
 
-        if not content:
-            continue
+    if is_local_enough(faq_matches):
+        # 📚 La FAQ locale suffit : pas de recherche web
+        return local
 
-        content = content[:500]
+    # 🔎 SEARCH (part du budget de la requête ; au-delà → réponse sans web)
+    try:
+        search_data = await within(search_web(question), SEARCH_SHARE, SEARCH_MAX_SECONDS)
+    except asyncio.TimeoutError:
+        print("⏱️ SEARCH TIMEOUT → IA sans données web")
+        search_data = None
 
-        block = f"Titre: {title}\nExtrait: {content}\n---\n"
+    # 🧹 CLEAN : meilleures phrases dans le budget de tokens
+    filtered = build_context(question, search_data)
+    return f"{local}\n{filtered}" if local else filtered
 
-        if total + len(block) > max_chars:
-            break
 
-        parts.append(block)
-        total += len(block)
+def make_prompt(question: str, context: str) -> str:
+    return f"""
+Tu es un assistant intelligent.
 
-    return "\n".join(parts) if parts else "Informations insuffisantes."
+Règles :
+- Réponds clairement
+- Structure avec listes ou tableaux si utile
+- N'invente rien
+- Si info insuffisante → dis-le
+
+Données :
+{context}
+
+Question :
+{question}
+"""
+
+
+def partial_answer(context: str) -> str:
+    """Réponse de repli quand l'IA dépasse le budget : les extraits trouvés."""
+    if not context or context in (NO_RESULTS, NOT_ENOUGH):
+        return "⏱️ Impossible de répondre à temps. Réessaie plus tard."
+
+    extracts = context.replace("Titre: ", "📌 ").replace("Extrait: ", "").replace("\n---", "\n")
+    return f"⏱️ L'IA n'a pas répondu à temps. Voici ce que j'ai trouvé :\n\n{extracts.strip()}"
+
+
+# =========================
+# 🚦 ADMISSION (par client / fournisseurs saturés)
+# =========================
+def client_key(request: Request) -> str:
+    peer = request.client.host if request.client else "inconnu"
+    return client_address(peer, request.headers.get("x-forwarded-for"))
+
+
+def retry_after(seconds: float) -> dict:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+def rate_limited(request: Request):
+    """Réponse 429 si le client a épuisé ses jetons, sinon None."""
+    wait = client_limiter.check(client_key(request))
+    if not wait:
+        return None
+    return JSONResponse(
+        status_code=429,
+        content={"source": "rate_limited", "answer": "⏳ Trop de questions d'affilée. Patiente un instant."},
+        headers=retry_after(wait),
+    )
+
+
+def busy_response(e: Busy) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"source": "busy", "answer": "⏳ BlackAI est très sollicité. Réessaie dans quelques secondes."},
+        headers=retry_after(e.retry_after),
+    )
 
 
 # =========================
 # 🚀 ROUTE PRINCIPALE
 # =========================
 @router.post("/blackai")
-async def blackai(data: Question):
+async def blackai(data: Question, request: Request):
     question = data.question.strip()
 
     if not question:
@@ -118,37 +280,33 @@ async def blackai(data: Question):
     if special:
         return {"source": "direct", "answer": special}
 
-    # 💾 2. CACHE (clé propre)
-    cached = get_cache(normalized_q)
+    # 💾 2. CACHE (clé propre, puis question quasi identique)
+    cached = await lookup_cache(question, normalized_q, client_key(request))
     if cached:
         return {"source": "cache", "answer": cached}
 
-    try:
-        # 🔎 3. SEARCH
-        search_data = await search_web(question)
+    # 📚 3. FAQ LOCALE (sans réseau)
+    faq_matches = search_faq(question)
+    faq_answer = direct_answer(faq_matches)
+    if faq_answer:
+        return {"source": "faq", "answer": faq_answer}
 
-        # 🧹 4. CLEAN
-        filtered = filter_search_results(search_data)
-
-        # 🧠 5. PROMPT
-        prompt = f"""
-Tu es un assistant intelligent.
-
-Règles :
-- Réponds clairement
-- Structure avec listes ou tableaux si utile
-- N'invente rien
-- Si info insuffisante → dis-le
+    # ⏱️ Échéance de la requête (propagée à la recherche et aux IA)
+    start_deadline()
 
-Données :
-{filtered}
+    # 🪣 4. Quota du client (seuls les appels externes consomment des jetons)
+    limited = rate_limited(request)
+    if limited:
+        return limited
 
-Question :
-{question}
-"""
+    try:
+        # 🛫 5. SEARCH + IA (mutualisés entre requêtes identiques)
+        source, answer = await inflight.do(
+            normalized_q, lambda: answer_question(question, normalized_q, faq_matches)
+        )
 
-        # 🤖 6. IA
-        answer = await generate_answer(prompt, question)
+    except Busy as e:
+        return busy_response(e)
 
     except Exception as e:
         print("❌ ERROR:", e)
@@ -157,10 +315,130 @@ Question :
             "answer": "❌ Une erreur est survenue. Réessaie plus tard."
         }
 
-    # 💾 7. CACHE SAVE
-    set_cache(normalized_q, answer)
-
     return {
-        "source": "live",
+        "source": source,
         "answer": answer
-    }
\ No newline at end of file
+    }
+
+
+async def answer_question(question: str, normalized_q: str, faq_matches: list = ()) -> tuple[str, str]:
+    """
+    (source, réponse) :
+    - "live"    : réponse de l'IA, mise en cache
+    - "partial" : l'IA n'a pas répondu dans le budget → extraits trouvés
+    - "error"   : aucune IA n'a répondu
+    Seules les réponses "live" sont mises en cache.
+    """
+    context = await gather_context(question, faq_matches)
+
+    # 🤖 IA (tout le temps restant)
+    try:
+        answer = await within(generate_answer(make_prompt(question, context), question))
+    except asyncio.TimeoutError:
+        print("⏱️ IA TIMEOUT → réponse partielle")
+        return "partial", partial_answer(context)
+
+    if answer == FALLBACK_ANSWER:
+        return "error", answer
+
+    # 💾 CACHE SAVE
+    await save_answer(question, normalized_q, answer)
+    return "live", answer
+
+
+# =========================
+# 📡 ROUTE STREAMING (SSE)
+# =========================
+def sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def single_event(event: str, payload: dict):
+    yield sse(event, payload)
+
+
+@router.post("/blackai/stream")
+async def blackai_stream(data: Question, request: Request):
+    """
+    Même pipeline que /blackai, mais la réponse de l'IA est relayée
+    morceau par morceau en Server-Sent Events :
+    - `answer` : réponse complète en un seul événement (intent, cache, FAQ,
+                 ou extraits si l'IA ne répond pas dans le budget)
+    - `token`  : morceau de réponse ; `done` à la fin du flux
+    - `error`  : échec (`source` = "busy" si les fournisseurs sont saturés)
+    """
+    question = data.question.strip()
+
+    if not question:
+        return sse_response(single_event("error", {"source": "error", "answer": "❌ Question vide."}))
+
+    normalized_q = normalize(question)
+
+    special = get_special_response(question)
+    if special:
+        return sse_response(single_event("answer", {"source": "direct", "answer": special}))
+
+    cached = await lookup_cache(question, normalized_q, client_key(request))
+    if cached:
+        return sse_response(single_event("answer", {"source": "cache", "answer": cached}))
+
+    faq_matches = search_faq(question)
+    faq_answer = direct_answer(faq_matches)
+    if faq_answer:
+        return sse_response(single_event("answer", {"source": "faq", "answer": faq_answer}))
+
+    limited = rate_limited(request)
+    if limited:
+        return limited
+
+    async def events():
+        # ⏱️ Échéance : recherche + premier morceau ; ensuite le flux continue
+        deadline = start_deadline()
+        parts = []
+        context = ""
+        try:
+            context = await gather_context(question, faq_matches)
+            tokens = stream_answer(make_prompt(question, context))
+            first = await asyncio.wait_for(anext(tokens, None), deadline.remaining())
+            if first is not None:
+                parts.append(first)
+                yield sse("token", {"text": first})
+
+            async for token in tokens:
+                parts.append(token)
+                yield sse("token", {"text": token})
+
+        except asyncio.TimeoutError:
+            print("⏱️ STREAM TIMEOUT → réponse partielle")
+            yield sse("answer", {"source": "partial", "answer": partial_answer(context)})
+            return
+
+        except Busy as e:
+            yield sse("error", {
+                "source": "busy",
+                "answer": "⏳ BlackAI est très sollicité. Réessaie dans quelques secondes.",
+                "retry_after": max(1, math.ceil(e.retry_after)),
+            })
+            return
+
+        except Exception as e:
+            print("❌ STREAM ERROR:", e)
+            yield sse("error", {
+                "source": "error",
+                "answer": "❌ Une erreur est survenue. Réessaie plus tard."
+            })
+            return
+
+        # 💾 Réponse complète → cache
+        await save_answer(question, normalized_q, "".join(parts))
+        yield sse("done", {"source": "live"})
+
+    return sse_response(events())
@@ -1,50 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from collections import defaultdict
+from decimal import Decimal
+from typing import Optional
+
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, UploadFile, status
+from sqlalchemy import insert, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from pydantic import BaseModel
 
-from app.models import Deposit, TransactionMethod, User, TransactionHistory
-from app.schemas import DepositCreate, DepositResponse
+from app.models import Deposit, User, TransactionHistory
+from app.schemas import (
+    DepositCreate,
+    DepositResponse,
+    DepositPage,
+    DepositBatchValidate,
+    DepositBatchItem,
+    DepositBatchResult,
+)
 from app.database import get_db
-from app.services.real_cash_service import add_real_cash
+from app.services.real_cash_service import add_real_cash, credit_real_cash_bulk
+from app.services.method_catalog import MethodCatalog, get_method_catalog
+from app.services.idempotency import get_replay, store_replay
+from app.services.statement_import import detect_format, import_statement
+from app.services.stats import record_deposits
+from app.utils.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    decode_cursor,
+    encode_cursor,
+)
 
 router = APIRouter(prefix="/deposits", tags=["Deposits"])
 
 # ============================================================
-# 🔹 Créer un dépôt
+# 🔹 Créer un dépôt (idempotent)
 # ============================================================
-@router.post("/", response_model=DepositResponse, status_code=status.HTTP_201_CREATED)
-async def create_deposit(data: DepositCreate, db: AsyncSession = Depends(get_db)):
-    method_result = await db.execute(select(TransactionMethod).where(TransactionMethod.id == data.method_id))
-    method = method_result.scalars().first()
-    if not method:
-        raise HTTPException(status_code=404, detail="Méthode de transaction introuvable")
-
-    user_result = await db.execute(select(User).where(User.id == data.user_id))
-    user = user_result.scalars().first()
-    if not user:
-        raise HTTPException(status_code=404, detail="Utilisateur introuvable")
-
-    existing_tx = await db.execute(select(Deposit).where(Deposit.transaction_id == data.transaction_id))
-    if existing_tx.scalars().first():
-        raise HTTPException(status_code=400, detail="Cet ID de transaction existe déjà")
-
-    deposit = Deposit(
-        user_id=data.user_id,
-        username=data.username,
-        phone=data.phone,
-        amount=data.amount,
-        transaction_id=data.transaction_id,
-        method_id=data.method_id,
-        status="pending",
-        country=data.country,
-        currency=data.currency,
-    )
-
-    db.add(deposit)
-    await db.commit()
-    await db.refresh(deposit)
-
+def _deposit_response(deposit, method_name: Optional[str]) -> DepositResponse:
     return DepositResponse(
         id=deposit.id,
         user_id=deposit.user_id,
@@ -53,36 +46,196 @@ async def create_deposit(data: DepositCreate, db: AsyncSession = Depends(get_db)
         amount=deposit.amount,
         transaction_id=deposit.transaction_id,
         status=deposit.status,
-        method_name=method.name,
-        currency=data.currency,
+        method_name=method_name,
+        currency=deposit.currency,
+    )
+
+
+@router.post("/", response_model=DepositResponse, status_code=status.HTTP_201_CREATED)
+async def create_deposit(
+    data: DepositCreate,
+    idempotency_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    catalog: MethodCatalog = Depends(get_method_catalog),
+):
+    """
+    Crée un dépôt en une seule requête (INSERT ... ON CONFLICT DO NOTHING).
+    Un renvoi du même dépôt (même `Idempotency-Key`, ou à défaut même
+    `transaction_id`) renvoie la réponse d'origine au lieu d'une erreur.
+    """
+    replay_key = f"deposit:{data.user_id}:{idempotency_key or data.transaction_id}"
+    replay = get_replay(replay_key)
+    if replay:
+        return replay
+
+    method = catalog.get(data.method_id)
+    if not method:
+        raise HTTPException(status_code=404, detail="Méthode de transaction introuvable")
+
+    stmt = (
+        pg_insert(Deposit)
+        .values(
+            user_id=data.user_id,
+            username=data.username,
+            phone=data.phone,
+            amount=data.amount,
+            transaction_id=data.transaction_id,
+            method_id=data.method_id,
+            status="pending",
+            country=data.country,
+            currency=data.currency,
+        )
+        .on_conflict_do_nothing(index_elements=[Deposit.transaction_id])
+        .returning(Deposit)
     )
 
+    try:
+        deposit = (await db.execute(stmt)).scalars().first()
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        # ---- Clé étrangère users.id : l'utilisateur n'existe pas
+        if "user_id" in str(e.orig):
+            raise HTTPException(status_code=404, detail="Utilisateur introuvable")
+        raise
+
+    if deposit is None:
+        # ---- Conflit : ce transaction_id existe déjà (autre worker, cache expiré...)
+        result = await db.execute(
+            select(Deposit).where(Deposit.transaction_id == data.transaction_id)
+        )
+        deposit = result.scalars().first()
+        if not deposit or deposit.user_id != data.user_id:
+            raise HTTPException(status_code=400, detail="Cet ID de transaction existe déjà")
+
+    response = _deposit_response(deposit, catalog.name_of(deposit.method_id))
+    store_replay(replay_key, response)
+    return response
+
 
 # ============================================================
-# 🔹 Lister tous les dépôts
+# 🔹 Lister les dépôts (pagination par curseur)
 # ============================================================
-@router.get("/", response_model=list[DepositResponse])
-async def list_deposits(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Deposit).order_by(Deposit.created_at.desc()))
-    deposits = result.scalars().all()
-
-    deposits_with_method = []
-    for deposit in deposits:
-        method = await db.get(TransactionMethod, deposit.method_id)
-        deposits_with_method.append(
-            DepositResponse(
-                id=deposit.id,
-                user_id=deposit.user_id,
-                username=deposit.username,
-                phone=deposit.phone,
-                amount=deposit.amount,
-                transaction_id=deposit.transaction_id,
-                status=deposit.status,
-                method_name=method.name if method else None,
-                currency=deposit.currency
-            )
+@router.get("/", response_model=DepositPage)
+async def list_deposits(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    method_id: Optional[int] = None,
+    country: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    catalog: MethodCatalog = Depends(get_method_catalog),
+):
+    """
+    Liste les dépôts du plus récent au plus ancien, page par page.
+    Le nom de la méthode est résolu depuis le catalogue en mémoire,
+    et la page suivante reprend après (created_at, id) du dernier élément :
+    le coût d'une page ne dépend pas de la taille de la table.
+    """
+    query = (
+        select(Deposit)
+        .order_by(Deposit.created_at.desc(), Deposit.id.desc())
+        .limit(limit + 1)
+    )
+
+    if status_filter:
+        query = query.where(Deposit.status == status_filter)
+    if method_id is not None:
+        query = query.where(Deposit.method_id == method_id)
+    if country:
+        query = query.where(Deposit.country == country)
+    if cursor:
+        last_created_at, last_id = decode_cursor(cursor, int)
+        query = query.where(
+            tuple_(Deposit.created_at, Deposit.id) < tuple_(last_created_at, last_id)
+        )
+
+    rows = (await db.execute(query)).scalars().all()
+
+    # ---- Une ligne de plus que demandé → il existe une page suivante
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    items = [_deposit_response(deposit, catalog.name_of(deposit.method_id)) for deposit in rows]
+    return DepositPage(items=items, next_cursor=next_cursor)
+
+
+# ============================================================
+# 🔹 Valider un lot de dépôts
+# ============================================================
+@router.post("/validate-batch", response_model=DepositBatchResult)
+async def validate_deposits_batch(data: DepositBatchValidate, db: AsyncSession = Depends(get_db)):
+    """
+    Valide plusieurs dépôts en une seule transaction, avec un nombre
+    constant de requêtes quelle que soit la taille du lot :
+    1. passage en "approved" des dépôts encore en attente (UPDATE ... RETURNING)
+    2. crédit RealCash agrégé par utilisateur (un seul upsert)
+    3. insertion groupée de l'historique
+    """
+    deposit_ids = list(dict.fromkeys(data.deposit_ids))
+
+    result = await db.execute(
+        update(Deposit)
+        .where(Deposit.id.in_(deposit_ids), Deposit.status == "pending")
+        .values(status="approved")
+        .returning(
+            Deposit.id,
+            Deposit.user_id,
+            Deposit.method_id,
+            Deposit.username,
+            Deposit.phone,
+            Deposit.transaction_id,
+            Deposit.country,
+            Deposit.amount,
         )
-    return deposits_with_method
+    )
+    approved = {row.id: row for row in result.all()}
+
+    # ---- Dépôts non validés : distinguer "introuvable" de "déjà traité"
+    skipped = [i for i in deposit_ids if i not in approved]
+    existing = set()
+    if skipped:
+        found = await db.execute(select(Deposit.id).where(Deposit.id.in_(skipped)))
+        existing = set(found.scalars().all())
+
+    if approved:
+        credits = defaultdict(Decimal)
+        for row in approved.values():
+            credits[row.user_id] += row.amount
+        await credit_real_cash_bulk(credits, db)
+
+        await db.execute(insert(TransactionHistory), [
+            {
+                "user_id": row.user_id,
+                "method_id": row.method_id,
+                "username": row.username,
+                "phone": row.phone,
+                "transaction_id": row.transaction_id,
+                "country": row.country,
+                "amount": row.amount,
+                "status": "approved",
+            }
+            for row in approved.values()
+        ])
+        await record_deposits(list(approved), db)
+
+    await db.commit()
+
+    results = []
+    for deposit_id in deposit_ids:
+        if deposit_id in approved:
+            results.append(DepositBatchItem(
+                deposit_id=deposit_id, status="approved", amount=approved[deposit_id].amount
+            ))
+        elif deposit_id in existing:
+            results.append(DepositBatchItem(deposit_id=deposit_id, status="already_processed"))
+        else:
+            results.append(DepositBatchItem(deposit_id=deposit_id, status="not_found"))
+
+    return DepositBatchResult(results=results, approved=len(approved))
 
 
 # ============================================================
@@ -90,7 +243,10 @@ async def list_deposits(db: AsyncSession = Depends(get_db)):
 # ============================================================
 @router.post("/{deposit_id}/validate")
 async def validate_deposit(deposit_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Deposit).where(Deposit.id == deposit_id))
+    # 🔒 Verrou de ligne : deux validations simultanées ne créditent qu'une fois
+    result = await db.execute(
+        select(Deposit).where(Deposit.id == deposit_id).with_for_update()
+    )
     deposit = result.scalars().first()
     if not deposit:
         raise HTTPException(status_code=404, detail="Dépôt introuvable")
@@ -101,9 +257,7 @@ async def validate_deposit(deposit_id: int, db: AsyncSession = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur introuvable")
 
-    real_cash = await add_real_cash(user.id, float(deposit.amount), db)
-    await db.commit()
-    await db.refresh(real_cash)
+    await add_real_cash(user.id, float(deposit.amount), db)
 
     history_entry = TransactionHistory(
         user_id=deposit.user_id,
@@ -118,6 +272,7 @@ async def validate_deposit(deposit_id: int, db: AsyncSession = Depends(get_db)):
     db.add(history_entry)
 
     deposit.status = "approved"
+    await record_deposits([deposit.id], db)
     await db.commit()
     await db.refresh(deposit)
 
@@ -133,7 +288,9 @@ async def validate_deposit(deposit_id: int, db: AsyncSession = Depends(get_db)):
 # ============================================================
 @router.post("/{deposit_id}/reject")
 async def reject_deposit(deposit_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Deposit).where(Deposit.id == deposit_id))
+    result = await db.execute(
+        select(Deposit).where(Deposit.id == deposit_id).with_for_update()
+    )
     deposit = result.scalars().first()
     if not deposit:
         raise HTTPException(status_code=404, detail="Dépôt introuvable")
@@ -153,6 +310,7 @@ async def reject_deposit(deposit_id: int, db: AsyncSession = Depends(get_db)):
     db.add(history_entry)
 
     deposit.status = "rejected"
+    await record_deposits([deposit.id], db)
     await db.commit()
     await db.refresh(deposit)
 
@@ -178,10 +336,8 @@ async def credit_user(data: ManualCredit, db: AsyncSession = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur introuvable")
 
-    # Créditer RealCash
-    real_cash = await add_real_cash(user.id, data.amount, db)
-    await db.commit()
-    await db.refresh(real_cash)
+    # Créditer RealCash (commit unique avec l'historique)
+    await add_real_cash(user.id, data.amount, db)
 
     # Créer un ID de transaction unique pour le crédit admin
     transaction_id = f"ADMIN-CREDIT-{int(datetime.utcnow().timestamp())}"
@@ -199,11 +355,32 @@ async def credit_user(data: ManualCredit, db: AsyncSession = Depends(get_db)):
     )
     db.add(history_entry)
     await db.commit()
-    await db.refresh(history_entry)
 
     return {
         "message": f"✅ Compte {user.email} crédité avec succès",
         "user_email": user.email,
         "amount": data.amount,
         "transaction_id": transaction_id
-    }
\ No newline at end of file
+    }
+
+
+# ============================================================
+# 🔹 Rapprochement d'un relevé opérateur
+# ============================================================
+STATEMENT_CHUNK_SIZE = 1024 * 1024
+
+@router.post("/admin/statements")
+async def import_provider_statement(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Importe un relevé MTN / Moov / Orange (CSV avec en-tête ou NDJSON,
+    colonnes `transaction_id` et `amount`) et le rapproche des dépôts.
+    """
+    async def chunks():
+        while chunk := await file.read(STATEMENT_CHUNK_SIZE):
+            yield chunk
+
+    return await import_statement(chunks(), db, fmt=format or detect_format(file.filename))
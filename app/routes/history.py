@@ -1,8 +1,18 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import String, cast, literal, tuple_, union_all
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.database import get_db
-from app.models import Deposit, TransactionMethod
+from app.models import Deposit, Withdrawal, TransactionHistory
+from app.services.method_catalog import MethodCatalog, get_method_catalog
+from app.utils.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    decode_cursor,
+    encode_cursor,
+)
 import locale
 
 # 🇫🇷 Forcer le format français pour la date
@@ -14,8 +24,17 @@ except:
 
 router = APIRouter(prefix="/history", tags=["History"])
 
+
+def format_date(created_at) -> Optional[str]:
+    return created_at.strftime("%d %B %Y à %Hh%M") if created_at else None
+
+
 @router.get("/{user_id}")
-async def get_user_history(user_id: int, db: AsyncSession = Depends(get_db)):
+async def get_user_history(
+    user_id: int,
+    db: AsyncSession = Depends(get_db),
+    catalog: MethodCatalog = Depends(get_method_catalog),
+):
     """
     Retourne l’historique des dépôts validés ou rejetés pour un utilisateur,
     avec la date formatée en français lisible.
@@ -25,21 +44,115 @@ async def get_user_history(user_id: int, db: AsyncSession = Depends(get_db)):
         .where(Deposit.user_id == user_id, Deposit.status.in_(["approved", "rejected"]))
         .order_by(Deposit.created_at.desc())
     )
-    deposits = result.scalars().all()
-
-    history = []
-    for dep in deposits:
-        method = await db.get(TransactionMethod, dep.method_id)
-        formatted_date = (
-            dep.created_at.strftime("%d %B %Y à %Hh%M")
-            if dep.created_at else None
-        )
-        history.append({
+
+    return [
+        {
             "id": dep.id,
-            "method_name": method.name if method else "Inconnue",
+            "method_name": catalog.name_of(dep.method_id) or "Inconnue",
             "amount": float(dep.amount),
             "status": dep.status,
-            "date": formatted_date
-        })
+            "date": format_date(dep.created_at)
+        }
+        for dep in result.scalars().all()
+    ]
+
+
+# ============================================================
+# 🔹 Grand livre unifié (dépôts + retraits + crédits admin)
+# ============================================================
+def _ledger_branch(kind, model, transaction_id, user_id, status_filter, cursor_key, limit):
+    """
+    Une branche du UNION : lignes d'une source pour l'utilisateur,
+    déjà filtrées par curseur et limitées, pour que chaque branche
+    se résolve par un parcours de l'index (user_id, created_at).
+    """
+    query = (
+        select(
+            literal(kind).label("kind"),
+            model.id.label("id"),
+            model.method_id.label("method_id"),
+            transaction_id.label("transaction_id"),
+            model.amount.label("amount"),
+            model.status.label("status"),
+            model.created_at.label("created_at"),
+        )
+        .where(model.user_id == user_id)
+        .order_by(model.created_at.desc(), model.id.desc())
+        .limit(limit)
+    )
+
+    if status_filter:
+        query = query.where(model.status == status_filter)
+    if cursor_key:
+        query = query.where(
+            tuple_(model.created_at, literal(kind), model.id) < tuple_(*cursor_key)
+        )
+
+    return query
+
+
+@router.get("/{user_id}/ledger")
+async def get_user_ledger(
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    db: AsyncSession = Depends(get_db),
+    catalog: MethodCatalog = Depends(get_method_catalog),
+):
+    """
+    Retourne toutes les opérations d'un utilisateur, de la plus récente à
+    la plus ancienne, en une seule requête UNION ALL :
+    - `deposit` : dépôts
+    - `withdrawal` : retraits
+    - `credit` : crédits manuels admin (TransactionHistory, ADMIN-CREDIT-*)
+    """
+    cursor_key = decode_cursor(cursor, str, int) if cursor else None
+
+    # ---- Les validations de dépôts/retraits écrivent aussi dans l'historique :
+    # ---- les crédits admin sont reconnus à leur préfixe (index partiel dédié).
+    credits_only = TransactionHistory.transaction_id.like("ADMIN-CREDIT-%")
+
+    branches = [
+        _ledger_branch(
+            "deposit", Deposit, Deposit.transaction_id,
+            user_id, status_filter, cursor_key, limit + 1,
+        ),
+        _ledger_branch(
+            "withdrawal", Withdrawal, literal("WDR-") + cast(Withdrawal.id, String),
+            user_id, status_filter, cursor_key, limit + 1,
+        ),
+        _ledger_branch(
+            "credit", TransactionHistory, TransactionHistory.transaction_id,
+            user_id, status_filter, cursor_key, limit + 1,
+        ).where(credits_only),
+    ]
+
+    ledger = union_all(*(select(b.subquery()) for b in branches)).cte("ledger")
+
+    result = await db.execute(
+        select(ledger)
+        .order_by(ledger.c.created_at.desc(), ledger.c.kind.desc(), ledger.c.id.desc())
+        .limit(limit + 1)
+    )
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.kind, last.id)
 
-    return history
+    items = [
+        {
+            "kind": row.kind,
+            "id": row.id,
+            "transaction_id": row.transaction_id,
+            "method_name": catalog.name_of(row.method_id) or "Inconnue",
+            "amount": float(row.amount),
+            "status": row.status,
+            "date": format_date(row.created_at)
+        }
+        for row in rows
+    ]
+    return {"items": items, "next_cursor": next_cursor}
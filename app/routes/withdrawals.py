@@ -1,18 +1,23 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import func, or_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from app.models import (
     Withdrawal,
-    TransactionMethod,
     User,
     TransactionHistory,
     UserPack,
     RealCash
 )
 from app.database import get_db
-from app.schemas import WithdrawalCreate, WithdrawalResponse
+from app.schemas import WithdrawalCreate, WithdrawalResponse, WithdrawalClaim
 from app.services.real_cash_service import remove_real_cash
+from app.services.method_catalog import MethodCatalog, get_method_catalog
+from app.services.stats import record_withdrawals
 
 router = APIRouter(prefix="/withdrawals", tags=["Withdrawals"])
 
@@ -23,7 +28,8 @@ router = APIRouter(prefix="/withdrawals", tags=["Withdrawals"])
 @router.post("/", response_model=WithdrawalResponse, status_code=status.HTTP_201_CREATED)
 async def create_withdrawal(
     data: WithdrawalCreate,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    catalog: MethodCatalog = Depends(get_method_catalog)
 ):
     # ---- Vérifie utilisateur
     user = await db.get(User, data.user_id)
@@ -31,7 +37,7 @@ async def create_withdrawal(
         raise HTTPException(404, "Utilisateur introuvable")
 
     # ---- Vérifie méthode
-    method = await db.get(TransactionMethod, data.method_id)
+    method = catalog.get(data.method_id)
     if not method or method.type != "withdrawal":
         raise HTTPException(400, "Méthode de retrait invalide")
 
@@ -80,41 +86,133 @@ async def create_withdrawal(
 # 🔹 Lister les retraits
 # ============================================================
 @router.get("/", response_model=list[WithdrawalResponse])
-async def list_withdrawals(db: AsyncSession = Depends(get_db)):
+async def list_withdrawals(
+    db: AsyncSession = Depends(get_db),
+    catalog: MethodCatalog = Depends(get_method_catalog)
+):
     result = await db.execute(
         select(Withdrawal).order_by(Withdrawal.created_at.desc())
     )
     withdrawals = result.scalars().all()
 
-    response = []
+    return [
+        WithdrawalResponse(
+            id=w.id,
+            user_id=w.user_id,
+            amount=w.amount,
+            status=w.status,
+            method_name=catalog.name_of(w.method_id),
+            address=w.address
+        )
+        for w in withdrawals
+    ]
+
 
-    for w in withdrawals:
-        method = await db.get(TransactionMethod, w.method_id)
+# ============================================================
+# 🔹 File de traitement : réserver les prochains retraits
+# ============================================================
+@router.post("/claim", response_model=list[WithdrawalResponse])
+async def claim_withdrawals(
+    data: WithdrawalClaim,
+    db: AsyncSession = Depends(get_db),
+    catalog: MethodCatalog = Depends(get_method_catalog)
+):
+    """
+    Réserve atomiquement les `limit` plus anciens retraits en attente
+    pour un validateur. Les lignes déjà verrouillées par un autre
+    validateur sont sautées (FOR UPDATE SKIP LOCKED) et une réservation
+    expirée remet le retrait dans la file.
+    """
+    candidates = (
+        select(Withdrawal.id)
+        .where(
+            Withdrawal.status == "pending",
+            or_(
+                Withdrawal.claimed_until.is_(None),
+                Withdrawal.claimed_until < func.now(),
+            ),
+        )
+        .order_by(Withdrawal.created_at)
+        .limit(data.limit)
+        .with_for_update(skip_locked=True)
+    )
 
-        response.append(
-            WithdrawalResponse(
-                id=w.id,
-                user_id=w.user_id,
-                amount=w.amount,
-                status=w.status,
-                method_name=method.name if method else None,
-                address=w.address
-            )
+    result = await db.execute(
+        update(Withdrawal)
+        .where(Withdrawal.id.in_(candidates))
+        .values(
+            claimed_by=data.validator,
+            claimed_until=func.now() + timedelta(seconds=data.lease_seconds),
+        )
+        .returning(
+            Withdrawal.id,
+            Withdrawal.user_id,
+            Withdrawal.method_id,
+            Withdrawal.address,
+            Withdrawal.amount,
+            Withdrawal.status,
+            Withdrawal.created_at,
+            Withdrawal.claimed_until,
         )
+    )
+    rows = sorted(result.all(), key=lambda row: row.created_at)
+    await db.commit()
 
-    return response
+    return [
+        WithdrawalResponse(
+            id=row.id,
+            user_id=row.user_id,
+            amount=row.amount,
+            status=row.status,
+            method_name=catalog.name_of(row.method_id),
+            address=row.address,
+            claimed_until=row.claimed_until
+        )
+        for row in rows
+    ]
 
 
 # ============================================================
-# 🔹 Valider un retrait
+# 🔹 File de traitement : libérer une réservation
 # ============================================================
-@router.post("/{withdrawal_id}/validate")
-async def validate_withdrawal(
+@router.post("/{withdrawal_id}/release")
+async def release_withdrawal(
     withdrawal_id: int,
+    validator: str,
     db: AsyncSession = Depends(get_db)
 ):
     result = await db.execute(
-        select(Withdrawal).where(Withdrawal.id == withdrawal_id)
+        update(Withdrawal)
+        .where(
+            Withdrawal.id == withdrawal_id,
+            Withdrawal.status == "pending",
+            Withdrawal.claimed_by == validator,
+        )
+        .values(claimed_by=None, claimed_until=None)
+        .returning(Withdrawal.id)
+    )
+    released = result.scalar()
+    await db.commit()
+
+    if released is None:
+        raise HTTPException(404, "Aucune réservation active pour ce retrait")
+
+    return {"message": "Retrait remis en file", "withdrawal_id": released}
+
+
+async def _lock_pending_withdrawal(
+    withdrawal_id: int,
+    validator: Optional[str],
+    db: AsyncSession
+) -> Withdrawal:
+    """
+    Verrouille le retrait pour la transaction en cours et vérifie
+    qu'il n'est pas réservé par un autre validateur.
+    """
+    result = await db.execute(
+        select(Withdrawal)
+        .where(Withdrawal.id == withdrawal_id)
+        .with_for_update()
     )
     withdrawal = result.scalars().first()
 
@@ -124,11 +222,33 @@ async def validate_withdrawal(
     if withdrawal.status != "pending":
         raise HTTPException(400, "Retrait déjà traité")
 
+    if (
+        withdrawal.claimed_by
+        and withdrawal.claimed_by != validator
+        and withdrawal.claimed_until
+        and withdrawal.claimed_until > datetime.now(timezone.utc)
+    ):
+        raise HTTPException(409, "Retrait réservé par un autre validateur")
+
+    return withdrawal
+
+
+# ============================================================
+# 🔹 Valider un retrait
+# ============================================================
+@router.post("/{withdrawal_id}/validate")
+async def validate_withdrawal(
+    withdrawal_id: int,
+    validator: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    withdrawal = await _lock_pending_withdrawal(withdrawal_id, validator, db)
+
     user = await db.get(User, withdrawal.user_id)
     if not user:
         raise HTTPException(404, "Utilisateur introuvable")
 
-    # ✅ Débit réel (CORRIGÉ)
+    # ✅ Débit réel atomique (même transaction que l'historique)
     await remove_real_cash(user.id, withdrawal.amount, db)
 
     # ---- Historique
@@ -145,6 +265,7 @@ async def validate_withdrawal(
     db.add(history)
 
     withdrawal.status = "approved"
+    await record_withdrawals([withdrawal.id], db)
 
     await db.commit()
     await db.refresh(withdrawal)
@@ -161,18 +282,10 @@ async def validate_withdrawal(
 @router.post("/{withdrawal_id}/reject")
 async def reject_withdrawal(
     withdrawal_id: int,
+    validator: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
-    result = await db.execute(
-        select(Withdrawal).where(Withdrawal.id == withdrawal_id)
-    )
-    withdrawal = result.scalars().first()
-
-    if not withdrawal:
-        raise HTTPException(404, "Retrait introuvable")
-
-    if withdrawal.status != "pending":
-        raise HTTPException(400, "Retrait déjà traité")
+    withdrawal = await _lock_pending_withdrawal(withdrawal_id, validator, db)
 
     history = TransactionHistory(
         user_id=withdrawal.user_id,
@@ -187,6 +300,7 @@ async def reject_withdrawal(
     db.add(history)
 
     withdrawal.status = "rejected"
+    await record_withdrawals([withdrawal.id], db)
 
     await db.commit()
     await db.refresh(withdrawal)
@@ -1,8 +1,9 @@
 # app/schemas.py
 
-from pydantic import BaseModel, condecimal
-from typing import Optional
+from pydantic import BaseModel, condecimal, conint, conlist
+from typing import List, Optional
 from decimal import Decimal
+from datetime import datetime
 
 # ============================================================
 # 💰 SCHEMAS DÉPÔT
@@ -34,6 +35,35 @@ class DepositResponse(BaseModel):
         orm_mode = True
 
 
+class DepositPage(BaseModel):
+    """
+    Page de dépôts paginée par curseur.
+    - `next_cursor` : à renvoyer tel quel pour obtenir la page suivante (None = fin)
+    """
+    items: List[DepositResponse]
+    next_cursor: Optional[str] = None
+
+
+class DepositBatchValidate(BaseModel):
+    """Liste des dépôts à valider en une seule transaction."""
+    deposit_ids: conlist(int, min_length=1, max_length=500)
+
+
+class DepositBatchItem(BaseModel):
+    """
+    Résultat pour un dépôt du lot.
+    - `status` : "approved", "already_processed" ou "not_found"
+    """
+    deposit_id: int
+    status: str
+    amount: Optional[Decimal] = None
+
+
+class DepositBatchResult(BaseModel):
+    results: List[DepositBatchItem]
+    approved: int
+
+
 # ============================================================
 # 💸 SCHEMAS RETRAIT
 # ============================================================
@@ -61,6 +91,18 @@ class WithdrawalResponse(BaseModel):
     status: str
     method_name: Optional[str] = None
     address: str
+    claimed_until: Optional[datetime] = None
 
     class Config:
         orm_mode = True
+
+
+class WithdrawalClaim(BaseModel):
+    """
+    Réservation des prochains retraits en attente par un validateur.
+    - `limit` : nombre maximum de retraits à réserver
+    - `lease_seconds` : durée de la réservation avant remise en file
+    """
+    validator: str
+    limit: conint(ge=1, le=100) = 10
+    lease_seconds: conint(ge=30, le=3600) = 300
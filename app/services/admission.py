@@ -0,0 +1,203 @@
+import asyncio
+import ipaddress
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from threading import Lock
+
+# =========================
+# 🚦 CONTRÔLE D'ADMISSION
+# =========================
+# - Par fournisseur : au plus N appels simultanés, une file d'attente
+#   bornée et un temps d'attente maximal. File pleine ou attente trop
+#   longue → Busy immédiat au lieu de surcharger le fournisseur.
+# - Par client : seau à jetons, pour qu'un seul utilisateur ne
+#   monopolise pas la capacité.
+
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", 32))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 2.0))
+DEFAULT_CONCURRENCY = {"gemini": 8, "openrouter": 8, "tavily": 8, "firecrawl": 4}
+
+CLIENT_RATE_PER_MINUTE = float(os.getenv("BLACKAI_RATE_PER_MINUTE", 20))
+CLIENT_BURST = int(os.getenv("BLACKAI_RATE_BURST", 5))
+CLIENT_MAX_TRACKED = int(os.getenv("BLACKAI_RATE_MAX_CLIENTS", 10000))
+# Proxies dont on accepte X-Forwarded-For (IP ou réseaux, séparés par des virgules)
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(p.strip(), strict=False)
+    for p in os.getenv("TRUSTED_PROXIES", "").split(",") if p.strip()
+]
+
+
+class Busy(Exception):
+    """Capacité saturée : réessayer après `retry_after` secondes."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name}: saturé")
+        self.name = name
+        self.retry_after = retry_after
+
+
+# =========================
+# 🔢 LIMITEUR DE CONCURRENCE
+# =========================
+class ConcurrencyLimiter:
+    def __init__(self, name: str, limit: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters = deque()
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    async def acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+
+        if len(self._waiters) >= self.queue_size:
+            self.rejected += 1
+            raise Busy(self.name, self.queue_timeout)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                self._waiters.remove(waiter)
+                waiter.cancel()
+                self.timed_out += 1
+                raise Busy(self.name, self.queue_timeout)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # place reçue juste avant l'annulation : on la rend
+            else:
+                self._waiters.remove(waiter)
+                waiter.cancel()
+            raise
+
+        self.admitted += 1
+
+    def release(self):
+        # La place passe directement au premier en attente
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "provider": self.name,
+            "limit": self.limit,
+            "active": self.active,
+            "queued": len(self._waiters),
+            "queue_size": self.queue_size,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+_limiters: dict[str, ConcurrencyLimiter] = {}
+
+
+def get_limiter(name: str) -> ConcurrencyLimiter:
+    limiter = _limiters.get(name)
+    if limiter is None:
+        limit = int(os.getenv(f"ADMISSION_{name.upper()}_CONCURRENCY", DEFAULT_CONCURRENCY.get(name, 8)))
+        limiter = _limiters[name] = ConcurrencyLimiter(name, limit, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT)
+    return limiter
+
+
+# =========================
+# 🪣 SEAUX À JETONS PAR CLIENT
+# =========================
+class ClientRateLimiter:
+    """Un seau par client (LRU borné) : `burst` jetons, rechargés à `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float, burst: int, max_clients: int):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # client → (jetons, instant)
+        self._lock = Lock()
+        self.limited = 0
+
+    def check(self, client: str) -> float:
+        """Consomme un jeton ; renvoie 0 si accepté, sinon le délai avant le prochain jeton."""
+        now = time.monotonic()
+
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                self.limited += 1
+                wait = (1 - tokens) / self.rate if self.rate else math.inf
+
+            self._buckets[client] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+
+        return wait
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._buckets),
+            "rate_per_minute": self.rate * 60,
+            "burst": self.burst,
+            "limited": self.limited,
+        }
+
+
+def _is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+
+def client_address(peer: str, forwarded_for: str = None) -> str:
+    """
+    Adresse du client pour les quotas. X-Forwarded-For est fourni par le
+    client : on ne le lit que si la connexion vient d'un proxy de
+    confiance, et de droite à gauche (entrées ajoutées par nos proxies)
+    jusqu'à la première adresse qui n'est pas un proxy.
+    """
+    if not forwarded_for or not _is_trusted_proxy(peer):
+        return peer
+
+    for hop in reversed([h.strip() for h in forwarded_for.split(",")]):
+        if hop and not _is_trusted_proxy(hop):
+            return hop
+    return peer
+
+
+client_limiter = ClientRateLimiter(CLIENT_RATE_PER_MINUTE, CLIENT_BURST, CLIENT_MAX_TRACKED)
+
+
+def admission_stats() -> dict:
+    return {
+        "providers": [limiter.stats() for limiter in _limiters.values()],
+        "clients": client_limiter.stats(),
+    }
@@ -1,11 +1,31 @@
-import httpx
+import asyncio
+import json
+import math
 import os
 import random
 import re
+import time
+
+from app.services.http_clients import get_client
+from app.services.circuit_breaker import get_breaker, order_by_health
+from app.services.admission import Busy, get_limiter
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
+# 🏁 Stratégie d'appel des IA (principal = Gemini tant qu'il est sain) :
+# - "hedge"      : le principal, puis le secours en parallèle s'il tarde (p95 observé)
+# - "race"       : les deux en même temps, la première réponse gagne
+# - "sequential" : le secours seulement après l'échec du principal
+LLM_MODE = os.getenv("BLACKAI_LLM_MODE", "hedge")
+HEDGE_DEFAULT_DELAY = float(os.getenv("BLACKAI_HEDGE_DEFAULT_DELAY", 3.0))
+HEDGE_MIN_DELAY = float(os.getenv("BLACKAI_HEDGE_MIN_DELAY", 0.5))
+HEDGE_MAX_DELAY = float(os.getenv("BLACKAI_HEDGE_MAX_DELAY", 8.0))
+HEDGE_MIN_SAMPLES = 20
+
+# ❌ Réponse quand aucune IA n'a répondu (jamais mise en cache)
+FALLBACK_ANSWER = "❌ Impossible de répondre pour le moment. Réessaie plus tard."
+
 # =========================
 # 🔤 NORMALISATION TEXTE
 # =========================
@@ -76,17 +96,16 @@ async def gemini_generate(prompt: str):
 
     url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={GEMINI_API_KEY}"
 
-    async with httpx.AsyncClient(timeout=20) as client:
-        res = await client.post(url, json={
-            "contents": [{"parts": [{"text": prompt}]}]
-        })
+    res = await get_client("gemini").post(url, json={
+        "contents": [{"parts": [{"text": prompt}]}]
+    })
 
-        data = res.json()
+    data = res.json()
 
-        try:
-            return data["candidates"][0]["content"]["parts"][0]["text"]
-        except Exception:
-            raise Exception(f"Gemini error: {data}")
+    try:
+        return data["candidates"][0]["content"]["parts"][0]["text"]
+    except Exception:
+        raise Exception(f"Gemini error: {data}")
 
 
 # =========================
@@ -96,28 +115,272 @@ async def openrouter_generate(prompt: str):
     if not OPENROUTER_API_KEY:
         raise Exception("OPENROUTER_API_KEY manquante")
 
-    async with httpx.AsyncClient(timeout=20) as client:
-        res = await client.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers={"Authorization": f"Bearer {OPENROUTER_API_KEY}"},
-            json={
-                "model": "deepseek/deepseek-chat",
-                "messages": [{"role": "user", "content": prompt}],
-            },
-        )
+    res = await get_client("openrouter").post(
+        "https://openrouter.ai/api/v1/chat/completions",
+        headers={"Authorization": f"Bearer {OPENROUTER_API_KEY}"},
+        json={
+            "model": "deepseek/deepseek-chat",
+            "messages": [{"role": "user", "content": prompt}],
+        },
+    )
+
+    data = res.json()
+
+    try:
+        return data["choices"][0]["message"]["content"]
+    except Exception:
+        raise Exception(f"OpenRouter error: {data}")
+
+
+# =========================
+# 🔌 FOURNISSEURS (avec disjoncteurs)
+# =========================
+PROVIDERS = {
+    "gemini": gemini_generate,
+    "openrouter": openrouter_generate,
+}
+
+
+async def _call_provider(name: str, prompt: str) -> str:
+    breaker = get_breaker(name)
+    limiter = get_limiter(name)
+
+    # 🚦 Fournisseur saturé : ni succès ni échec pour le disjoncteur
+    try:
+        await limiter.acquire()
+    except (Busy, asyncio.CancelledError):
+        breaker.release()
+        raise
+
+    print(f"🔥 {name.upper()}")
+    start = time.monotonic()
+
+    try:
+        answer = await PROVIDERS[name](prompt)
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception:
+        breaker.record_failure()
+        raise
+    finally:
+        limiter.release()
+
+    breaker.record_success(time.monotonic() - start)
+    return answer
+
+
+def llm_available() -> bool:
+    """True si au moins une IA est saine et sans file d'attente (sert aux tâches de fond)."""
+    return any(
+        get_breaker(name).available() and not get_limiter(name).stats()["queued"]
+        for name in PROVIDERS
+    )
+
+
+def hedge_delay(provider: str = "gemini") -> float:
+    """Délai avant de lancer le secours : p95 récent du fournisseur principal, borné."""
+    window = get_breaker(provider).latency
+    if len(window) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, window.percentile(95)))
+
+
+async def first_success(attempts: list, prompt: str) -> str:
+    """
+    Lance les fournisseurs `(nom, délai)` de façon échelonnée et renvoie
+    la première réponse réussie ; les appels restants sont annulés.
+    Un fournisseur est aussi lancé dès que plus aucun appel n'est en cours
+    (échec du précédent), sans attendre son délai. Un fournisseur dont le
+    disjoncteur est ouvert est sauté immédiatement. Si tous les fournisseurs
+    disponibles sont saturés, lève Busy.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    queue = sorted(attempts, key=lambda attempt: attempt[1])
+    running = {}
+    errors = []
+    busy = []
+
+    try:
+        while queue or running:
+            while queue and (not running or loop.time() - start >= queue[0][1]):
+                name, _ = queue.pop(0)
+                if not get_breaker(name).allow():
+                    errors.append(f"{name}: circuit ouvert")
+                    continue
+                running[asyncio.create_task(_call_provider(name, prompt))] = name
+
+            if not running:
+                break  # tous les circuits sont ouverts : rien à attendre
+
+            timeout = None
+            if queue and math.isfinite(queue[0][1]):
+                timeout = max(0.0, start + queue[0][1] - loop.time())
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                name = running.pop(task)
+                if task.exception() is None:
+                    return task.result()
+                print(f"❌ {name.upper()}:", task.exception())
+                errors.append(f"{name}: {task.exception()}")
+                if isinstance(task.exception(), Busy):
+                    busy.append(task.exception())
+
+        if busy and len(busy) == len(errors):
+            raise min(busy, key=lambda e: e.retry_after)
+        raise Exception(" | ".join(errors))
+
+    finally:
+        # 🛑 Annule le perdant
+        for task in running:
+            task.cancel()
+
+
+def plan_attempts(mode: str = None) -> list:
+    mode = mode or LLM_MODE
+    # 🩺 Le fournisseur le plus sain passe en premier
+    primary, secondary = order_by_health(list(PROVIDERS))
+    if mode == "race":
+        return [(primary, 0.0), (secondary, 0.0)]
+    if mode == "sequential":
+        return [(primary, 0.0), (secondary, float("inf"))]
+    return [(primary, 0.0), (secondary, hedge_delay(primary))]
+
+
+# =========================
+# 📡 STREAMING (SSE fournisseurs)
+# =========================
+async def _sse_payloads(lines):
+    """Extrait les charges `data:` d'un flux SSE (commentaires et [DONE] ignorés)."""
+    async for line in lines:
+        if not line.startswith("data:"):
+            continue
+        payload = line[5:].strip()
+        if not payload or payload == "[DONE]":
+            continue
+        yield json.loads(payload)
+
+
+async def gemini_stream(prompt: str):
+    if not GEMINI_API_KEY:
+        raise Exception("GEMINI_API_KEY manquante")
+
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:streamGenerateContent?alt=sse&key={GEMINI_API_KEY}"
+
+    async with get_client("gemini").stream("POST", url, json={
+        "contents": [{"parts": [{"text": prompt}]}]
+    }) as res:
+        if res.status_code >= 400:
+            raise Exception(f"Gemini error: {(await res.aread()).decode(errors='replace')}")
+
+        async for data in _sse_payloads(res.aiter_lines()):
+            try:
+                text = data["candidates"][0]["content"]["parts"][0].get("text")
+            except (KeyError, IndexError):
+                raise Exception(f"Gemini error: {data}")
+            if text:
+                yield text
+
+
+async def openrouter_stream(prompt: str):
+    if not OPENROUTER_API_KEY:
+        raise Exception("OPENROUTER_API_KEY manquante")
+
+    async with get_client("openrouter").stream(
+        "POST",
+        "https://openrouter.ai/api/v1/chat/completions",
+        headers={"Authorization": f"Bearer {OPENROUTER_API_KEY}"},
+        json={
+            "model": "deepseek/deepseek-chat",
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": True,
+        },
+    ) as res:
+        if res.status_code >= 400:
+            raise Exception(f"OpenRouter error: {(await res.aread()).decode(errors='replace')}")
+
+        async for data in _sse_payloads(res.aiter_lines()):
+            if "error" in data:
+                raise Exception(f"OpenRouter error: {data['error']}")
+            text = (data.get("choices") or [{}])[0].get("delta", {}).get("content")
+            if text:
+                yield text
+
+
+STREAM_PROVIDERS = {
+    "gemini": gemini_stream,
+    "openrouter": openrouter_stream,
+}
+
+
+async def stream_answer(prompt: str):
+    """
+    Relaie la réponse de l'IA morceau par morceau.
+    Fournisseurs essayés du plus sain au moins sain ; on ne bascule sur
+    le suivant que si aucun morceau n'a encore été envoyé au client.
+    Si tous les fournisseurs disponibles sont saturés, lève Busy.
+    """
+    errors = []
+    busy = []
+
+    for name in order_by_health(list(STREAM_PROVIDERS)):
+        breaker = get_breaker(name)
+        if not breaker.allow():
+            errors.append(f"{name}: circuit ouvert")
+            continue
 
-        data = res.json()
+        limiter = get_limiter(name)
+        try:
+            await limiter.acquire()
+        except (Busy, asyncio.CancelledError) as e:
+            breaker.release()
+            if not isinstance(e, Busy):
+                raise
+            errors.append(str(e))
+            busy.append(e)
+            continue
+
+        print(f"🔥 {name.upper()} (stream)")
+        start = time.monotonic()
+        emitted = False
 
         try:
-            return data["choices"][0]["message"]["content"]
-        except Exception:
-            raise Exception(f"OpenRouter error: {data}")
+            async for token in STREAM_PROVIDERS[name](prompt):
+                emitted = True
+                yield token
+        except (asyncio.CancelledError, GeneratorExit):
+            # Client déconnecté : l'appel n'est ni un succès ni un échec
+            breaker.release()
+            raise
+        except Exception as e:
+            breaker.record_failure()
+            print(f"❌ {name.upper()}:", e)
+            if emitted:
+                raise
+            errors.append(f"{name}: {e}")
+            continue
+        finally:
+            limiter.release()
+
+        if not emitted:
+            breaker.record_failure()
+            errors.append(f"{name}: réponse vide")
+            continue
+
+        breaker.record_success(time.monotonic() - start)
+        return
+
+    if busy and len(busy) == len(errors):
+        raise min(busy, key=lambda e: e.retry_after)
+    raise Exception(" | ".join(errors))
 
 
 # =========================
 # 🧠 MAIN GENERATOR
 # =========================
-async def generate_answer(prompt: str, question: str = None):
+async def generate_answer(prompt: str, question: str = None, mode: str = None):
     # 🎯 Détection rapide (évite appel IA inutile)
     if question:
         special = get_special_response(question)
@@ -125,28 +388,17 @@ async def generate_answer(prompt: str, question: str = None):
             print(f"⚡ Intent détecté → {question}")
             return special
 
-    errors = []
-
-    # 🔥 GEMINI
     try:
-        print("🔥 GEMINI")
-        return await gemini_generate(prompt)
+        return await first_success(plan_attempts(mode), prompt)
 
-    except Exception as e:
-        print("❌ GEMINI:", e)
-        errors.append(str(e))
-
-    # 🔥 FALLBACK OPENROUTER
-    try:
-        print("🔥 OPENROUTER (fallback)")
-        return await openrouter_generate(prompt)
+    except Busy:
+        raise  # 🚦 la route répond 503
 
     except Exception as e:
-        print("❌ OPENROUTER:", e)
-        errors.append(str(e))
+        print("❌ IA:", e)
 
     # ❌ ERREUR FINALE
-    return "❌ Impossible de répondre pour le moment. Réessaie plus tard."
+    return FALLBACK_ANSWER
 
 
 # =========================
@@ -1,55 +1,431 @@
+import asyncio
+import json
+import os
+import sqlite3
+import sys
 import time
+from collections import OrderedDict
 from threading import Lock
 
-cache_store = {}
-cache_lock = Lock()
+CACHE_TTL = int(os.getenv("BLACKAI_CACHE_TTL", 60 * 60 * 24))  # 🔥 24h : expiration définitive
+CACHE_SOFT_TTL = int(os.getenv("BLACKAI_CACHE_SOFT_TTL", 60 * 60))  # 🔥 1h : rafraîchie en arrière-plan ensuite
+CACHE_MAX_BYTES = int(os.getenv("BLACKAI_CACHE_MAX_BYTES", 32 * 1024 * 1024))  # 🔥 32 Mo
+SWEEP_INTERVAL = int(os.getenv("CACHE_SWEEP_INTERVAL", 60))
+CACHE_BACKEND = os.getenv("BLACKAI_CACHE_BACKEND", "memory")  # "memory" | "sqlite"
+CACHE_PATH = os.getenv("BLACKAI_CACHE_PATH", "blackai_cache.sqlite3")
+CACHE_BUSY_TIMEOUT = float(os.getenv("BLACKAI_CACHE_BUSY_TIMEOUT", 0.1))  # 🔥 100 ms puis « absent »
+CACHE_MAINTENANCE_INTERVAL = int(os.getenv("BLACKAI_CACHE_MAINTENANCE_INTERVAL", 600))
+CACHE_VACUUM_PAGES = int(os.getenv("BLACKAI_CACHE_VACUUM_PAGES", 1000))
 
-CACHE_TTL = 60 * 60 * 24  # 🔥 24h
-MAX_CACHE_SIZE = 1000     # 🔥 limite sécurité
 
+def estimate_size(key: str, value) -> int:
+    """Taille approximative d'une entrée, en octets."""
+    if isinstance(value, (str, bytes)):
+        size = len(value.encode() if isinstance(value, str) else value)
+    else:
+        try:
+            size = len(json.dumps(value, default=str))
+        except (TypeError, ValueError):
+            size = sys.getsizeof(value)
+    return size + len(key.encode()) + 64  # + surcoût de l'entrée
 
-def get_cache(key: str):
-    now = time.time()
 
-    with cache_lock:
-        data = cache_store.get(key)
+# =========================
+# 🧠 MOTEUR LRU + TTL
+# =========================
+class TTLCache:
+    """
+    Cache mémoire LRU avec expiration par entrée et budget en octets.
+    Toutes les opérations sont en O(1) : l'OrderedDict garde l'ordre
+    d'utilisation, l'éviction retire simplement la tête.
+    Une entrée peut aussi avoir un TTL souple : au-delà elle est encore
+    servie mais signalée périmée (voir get_entry).
+    """
 
-        if not data:
-            return None
+    def __init__(self, name: str, max_bytes: int, default_ttl: float):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # clé → (valeur, expire_à, périmée_à, taille)
+        self._lock = Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        _registry.append(self)
 
-        # ⏳ Expiration
-        if now - data["time"] > CACHE_TTL:
-            del cache_store[key]
-            return None
+    def get(self, key: str):
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
 
-        return data["value"]
+    def get_entry(self, key: str):
+        """(valeur, périmée ?) ou None si absente ou expirée."""
+        now = time.monotonic()
 
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
 
-def set_cache(key: str, value):
-    now = time.time()
+            value, expires_at, stale_at, _ = entry
+            if expires_at <= now:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
 
-    with cache_lock:
-        # 🔥 Limite mémoire
-        if len(cache_store) >= MAX_CACHE_SIZE:
-            # supprime les plus anciens
-            oldest_key = min(cache_store, key=lambda k: cache_store[k]["time"])
-            del cache_store[oldest_key]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            stale = stale_at <= now
+            if stale:
+                self.stale_hits += 1
+            return value, stale
 
-        cache_store[key] = {
-            "value": value,
-            "time": now
-        }
+    def set(self, key: str, value, ttl: float = None, soft_ttl: float = None):
+        size = estimate_size(key, value)
+        if size > self.max_bytes:
+            return  # trop gros pour le budget : on ne met pas en cache
 
+        now = time.monotonic()
+        expires_at = now + (ttl if ttl is not None else self.default_ttl)
+        stale_at = min(now + soft_ttl, expires_at) if soft_ttl is not None else expires_at
 
-def clean_cache():
-    """Nettoyage global (optionnel mais recommandé)"""
-    now = time.time()
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
 
-    with cache_lock:
-        keys_to_delete = [
-            k for k, v in cache_store.items()
-            if now - v["time"] > CACHE_TTL
-        ]
+            self._entries[key] = (value, expires_at, stale_at, size)
+            self._bytes += size
 
-        for k in keys_to_delete:
-            del cache_store[k]
\ No newline at end of file
+            # 🔥 Limite mémoire : éviction des moins récemment utilisées
+            while self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def sweep(self) -> int:
+        """Supprime les entrées expirées ; renvoie leur nombre."""
+        now = time.monotonic()
+
+        with self._lock:
+            expired = [k for k, (_, expires_at, _, _) in self._entries.items() if expires_at <= now]
+            for k in expired:
+                self._remove(k)
+            self.expirations += len(expired)
+
+        return len(expired)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _remove(self, key: str):
+        _, _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+
+# =========================
+# 💽 BACKEND PERSISTANT (SQLITE WAL)
+# =========================
+class SQLiteCache:
+    """
+    Cache persistant partagé par tous les workers d'une même machine.
+    SQLite en mode WAL : lectures concurrentes sans blocage, une seule
+    écriture à la fois. Les entrées survivent aux redémarrages.
+    - Les appels sont bloquants : utiliser les helpers async ci-dessous
+      (exécutés dans un thread, jamais sur la boucle d'événements).
+    - Base occupée au-delà de CACHE_BUSY_TIMEOUT : lecture = absente,
+      écriture abandonnée (c'est un cache).
+    - Le budget en octets est appliqué à chaque écriture (plus anciennes
+      d'abord) ; le total est tenu à jour par des triggers.
+    """
+
+    blocking = True
+
+    def __init__(self, name: str, path: str, max_bytes: int, default_ttl: float):
+        self.name = name
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._lock = Lock()
+        self._conn = None
+        self._pid = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.busy = 0
+        self.evictions = 0
+        self.expirations = 0
+        _registry.append(self)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Une connexion par processus (les workers uvicorn sont forkés)
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=CACHE_BUSY_TIMEOUT, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    stale_at REAL,
+                    created_at REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )
+            """)
+            # Fichiers créés avant l'ajout du TTL souple
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(cache)")}
+            if "stale_at" not in columns:
+                conn.execute("ALTER TABLE cache ADD COLUMN stale_at REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_expires_at ON cache (expires_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_created_at ON cache (created_at)")
+
+            # 📏 Taille totale tenue par triggers (pas de SUM(size) à chaque écriture)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_meta (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    total_bytes INTEGER NOT NULL,
+                    maintained_at REAL NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("INSERT OR IGNORE INTO cache_meta (id, total_bytes) SELECT 1, COALESCE(SUM(size), 0) FROM cache")
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS cache_size_insert AFTER INSERT ON cache
+                BEGIN UPDATE cache_meta SET total_bytes = total_bytes + new.size WHERE id = 1; END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS cache_size_delete AFTER DELETE ON cache
+                BEGIN UPDATE cache_meta SET total_bytes = total_bytes - old.size WHERE id = 1; END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS cache_size_update AFTER UPDATE OF size ON cache
+                BEGIN UPDATE cache_meta SET total_bytes = total_bytes + new.size - old.size WHERE id = 1; END
+            """)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, key: str):
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key: str):
+        """(valeur, périmée ?) ou None si absente, expirée ou base occupée."""
+        now = time.time()
+
+        with self._lock:
+            try:
+                row = self._connection().execute(
+                    "SELECT value, stale_at FROM cache WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+            except sqlite3.OperationalError:
+                self.busy += 1
+                self.misses += 1
+                return None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            stale = row[1] is not None and row[1] <= now
+            if stale:
+                self.stale_hits += 1
+            return json.loads(row[0]), stale
+
+    def set(self, key: str, value, ttl: float = None, soft_ttl: float = None):
+        payload = json.dumps(value, ensure_ascii=False)
+        size = len(payload.encode()) + len(key.encode())
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.default_ttl)
+        stale_at = min(now + soft_ttl, expires_at) if soft_ttl is not None else None
+
+        with self._lock:
+            try:
+                conn = self._connection()
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("""
+                    INSERT INTO cache (key, value, expires_at, stale_at, created_at, size)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET
+                        value = excluded.value, expires_at = excluded.expires_at,
+                        stale_at = excluded.stale_at, created_at = excluded.created_at,
+                        size = excluded.size
+                """, (key, payload, expires_at, stale_at, now, size))
+                self._enforce_budget(conn)
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                # Base occupée : l'entrée n'est simplement pas mise en cache
+                self.busy += 1
+                if self._conn is not None and self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+
+    def _enforce_budget(self, conn: sqlite3.Connection):
+        """Supprime les entrées les plus anciennes jusqu'à repasser sous le budget."""
+        excess = conn.execute("SELECT total_bytes FROM cache_meta WHERE id = 1").fetchone()[0] - self.max_bytes
+        while excess > 0:
+            oldest = conn.execute("SELECT key, size FROM cache ORDER BY created_at LIMIT 64").fetchall()
+            if not oldest:
+                break
+            victims = []
+            for key, size in oldest:
+                victims.append((key,))
+                excess -= size
+                if excess <= 0:
+                    break
+            conn.executemany("DELETE FROM cache WHERE key = ?", victims)
+            self.evictions += len(victims)
+
+    def delete(self, key: str):
+        with self._lock:
+            try:
+                self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+            except sqlite3.OperationalError:
+                self.busy += 1
+
+    def sweep(self) -> int:
+        """Purge les entrées expirées ; un seul worker à la fois fait la compaction du fichier."""
+        now = time.time()
+
+        with self._lock:
+            try:
+                conn = self._connection()
+                expired = conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,)).rowcount
+                self.expirations += expired
+
+                # 🏁 Le premier worker à marquer la compaction la fait, les autres passent
+                claimed = conn.execute(
+                    "UPDATE cache_meta SET maintained_at = ? WHERE id = 1 AND maintained_at <= ?",
+                    (now, now - CACHE_MAINTENANCE_INTERVAL),
+                ).rowcount
+                if claimed:
+                    conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+                    conn.execute(f"PRAGMA incremental_vacuum({CACHE_VACUUM_PAGES})")
+            except sqlite3.OperationalError:
+                self.busy += 1
+                return 0
+
+        return expired
+
+    def clear(self):
+        with self._lock:
+            try:
+                self._connection().execute("DELETE FROM cache")
+            except sqlite3.OperationalError:
+                self.busy += 1
+
+    def stats(self) -> dict:
+        """Compteurs du cache ; entries / bytes à None si la base est occupée."""
+        with self._lock:
+            try:
+                conn = self._connection()
+                entries = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+                total = conn.execute("SELECT total_bytes FROM cache_meta WHERE id = 1").fetchone()[0]
+            except sqlite3.OperationalError:
+                self.busy += 1
+                entries = total = None
+
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "backend": "sqlite",
+                "path": self.path,
+                "entries": entries,
+                "bytes": total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "busy": self.busy,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+async def run_blocking(cache, method: str, *args, **kwargs):
+    """Appelle une méthode du cache hors de la boucle d'événements si elle fait des I/O."""
+    fn = getattr(cache, method)
+    if getattr(cache, "blocking", False):
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+_registry: list = []
+
+
+async def all_cache_stats() -> list:
+    return [await run_blocking(cache, "stats") for cache in _registry]
+
+
+# =========================
+# 🧹 NETTOYAGE PÉRIODIQUE
+# =========================
+async def run_cache_sweeper(interval: float = SWEEP_INTERVAL):
+    """Tâche de fond : purge régulièrement les entrées expirées de tous les caches."""
+    while True:
+        await asyncio.sleep(interval)
+        for cache in list(_registry):
+            try:
+                removed = await run_blocking(cache, "sweep")
+            except Exception as e:
+                print(f"❌ Cache {cache.name} : échec du nettoyage ({e})")
+                continue
+            if removed:
+                print(f"🧹 Cache {cache.name} : {removed} entrées expirées supprimées")
+
+
+# =========================
+# 💾 CACHE DES RÉPONSES BLACKAI
+# =========================
+if CACHE_BACKEND == "sqlite":
+    answer_cache = SQLiteCache("blackai", CACHE_PATH, max_bytes=CACHE_MAX_BYTES, default_ttl=CACHE_TTL)
+else:
+    answer_cache = TTLCache("blackai", max_bytes=CACHE_MAX_BYTES, default_ttl=CACHE_TTL)
+
+
+async def get_cache(key: str):
+    return await run_blocking(answer_cache, "get", key)
+
+
+async def get_cache_entry(key: str):
+    """(réponse, périmée ?) : une réponse périmée est servie puis rafraîchie."""
+    return await run_blocking(answer_cache, "get_entry", key)
+
+
+async def set_cache(key: str, value, soft_ttl: float = CACHE_SOFT_TTL):
+    await run_blocking(answer_cache, "set", key, value, soft_ttl=soft_ttl)
+
+
+async def clean_cache() -> int:
+    """Nettoyage global des entrées expirées"""
+    return await run_blocking(answer_cache, "sweep")
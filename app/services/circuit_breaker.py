@@ -0,0 +1,149 @@
+import os
+import time
+from collections import deque
+from threading import Lock
+
+from app.services.latency import LatencyWindow
+
+# =========================
+# 🔌 DISJONCTEURS PAR FOURNISSEUR
+# =========================
+# Chaque fournisseur (Tavily, Firecrawl, Gemini, OpenRouter) a un
+# disjoncteur qui mémorise ses derniers appels :
+# - fermé     : appels normaux
+# - ouvert    : trop d'échecs ou d'appels lents → le fournisseur est
+#               sauté immédiatement pendant BREAKER_OPEN_SECONDS
+# - semi-ouvert : un appel test décide de la réouverture ou de la fermeture
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", 60))
+BREAKER_WINDOW_SIZE = int(os.getenv("BREAKER_WINDOW_SIZE", 50))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", 5))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", 0.5))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", 15))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", 30))
+
+
+class CircuitBreaker:
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.latency = LatencyWindow()        # latences des appels réussis
+        self._outcomes = deque(maxlen=BREAKER_WINDOW_SIZE)  # (instant, échec ?)
+        self._probe_started_at = None       # appel test en cours (semi-ouvert)
+        self._lock = Lock()
+
+    # ---- Décision
+    def allow(self) -> bool:
+        """True si un appel peut partir maintenant (réserve l'appel test en semi-ouvert)."""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < BREAKER_OPEN_SECONDS:
+                    return False
+                self.state = HALF_OPEN
+
+            if self.state == HALF_OPEN:
+                now = time.monotonic()
+                # Un appel test jamais conclu (tâche annulée) n'est pas bloquant indéfiniment
+                if self._probe_started_at is not None and now - self._probe_started_at < BREAKER_OPEN_SECONDS:
+                    return False
+                self._probe_started_at = now
+
+            return True
+
+    def available(self) -> bool:
+        """True si un appel serait tenté (fermé, semi-ouvert, ou ouverture écoulée), sans rien réserver."""
+        with self._lock:
+            return self.state != OPEN or time.monotonic() - self.opened_at >= BREAKER_OPEN_SECONDS
+
+    def release(self):
+        """Appel autorisé mais abandonné (annulé) : libère l'appel test."""
+        with self._lock:
+            self._probe_started_at = None
+
+    # ---- Résultats
+    def record_success(self, seconds: float):
+        self.latency.record(seconds)
+        self._record(failed=seconds > BREAKER_SLOW_CALL_SECONDS)
+
+    def record_failure(self):
+        self._record(failed=True)
+
+    def _record(self, failed: bool):
+        now = time.monotonic()
+
+        with self._lock:
+            self._probe_started_at = None
+
+            if self.state == HALF_OPEN:
+                if failed:
+                    self._open(now)
+                else:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                return
+
+            self._outcomes.append((now, failed))
+            calls, failures = self._window(now)
+            if calls >= BREAKER_MIN_CALLS and failures / calls >= BREAKER_FAILURE_RATE:
+                self._open(now)
+
+    def _open(self, now: float):
+        self.state = OPEN
+        self.opened_at = now
+        print(f"🔌 Disjoncteur {self.name} ouvert")
+
+    def _window(self, now: float):
+        while self._outcomes and now - self._outcomes[0][0] > BREAKER_WINDOW_SECONDS:
+            self._outcomes.popleft()
+        return len(self._outcomes), sum(1 for _, failed in self._outcomes if failed)
+
+    # ---- Santé
+    def error_rate(self) -> float:
+        """Taux d'erreur récent (0 tant qu'il y a trop peu d'appels pour juger)."""
+        with self._lock:
+            calls, failures = self._window(time.monotonic())
+        return failures / calls if calls >= BREAKER_MIN_CALLS else 0.0
+
+    def health_key(self):
+        """Clé de tri : fermé avant semi-ouvert avant ouvert, puis taux d'erreur récent."""
+        rank = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}[self.state]
+        return (rank, round(self.error_rate(), 1))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            calls, failures = self._window(time.monotonic())
+            state = self.state
+            retry_in = max(0.0, BREAKER_OPEN_SECONDS - (time.monotonic() - self.opened_at)) if state == OPEN else 0.0
+
+        return {
+            "provider": self.name,
+            "state": state,
+            "calls": calls,
+            "failures": failures,
+            "error_rate": round(failures / calls, 3) if calls else 0.0,
+            "p50_latency": self.latency.percentile(50),
+            "p95_latency": self.latency.percentile(95),
+            "retry_in": round(retry_in, 1),
+        }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name)
+    return breaker
+
+
+def order_by_health(names: list) -> list:
+    """Fournisseurs du plus sain au moins sain (ordre d'origine en cas d'égalité)."""
+    return sorted(names, key=lambda name: get_breaker(name).health_key())
+
+
+def all_breakers() -> list:
+    return [breaker.snapshot() for breaker in _breakers.values()]
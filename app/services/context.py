@@ -0,0 +1,128 @@
+import math
+import os
+import re
+from collections import Counter
+
+from app.services.near_dup import jaccard
+from app.services.text import tokenize
+
+# =========================
+# 🧩 CONTEXTE DU PROMPT
+# =========================
+# Les résultats de recherche sont découpés en phrases, chaque phrase est
+# notée (BM25) par rapport à la question, les quasi-doublons sont retirés
+# puis les meilleures phrases sont gardées dans un budget de tokens.
+# Prompt plus court → réponse de l'IA plus rapide, et moins de bruit.
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("BLACKAI_CONTEXT_TOKENS", 450))
+CONTEXT_DUP_THRESHOLD = float(os.getenv("BLACKAI_CONTEXT_DUP_THRESHOLD", 0.7))  # Jaccard
+MIN_SENTENCE_CHARS = 20
+MAX_SENTENCE_CHARS = 400
+CHARS_PER_TOKEN = 4     # approximation courante (FR/EN)
+RANK_DECAY = 0.1        # léger avantage aux premiers résultats du fournisseur
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+NO_RESULTS = "Aucune information pertinente trouvée."
+NOT_ENOUGH = "Informations insuffisantes."
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def split_sentences(text: str) -> list[str]:
+    sentences = []
+    for sentence in _SENTENCE_RE.split(text):
+        sentence = " ".join(sentence.split())
+        if len(sentence) < MIN_SENTENCE_CHARS:
+            continue
+        if len(sentence) > MAX_SENTENCE_CHARS:
+            sentence = sentence[:MAX_SENTENCE_CHARS].rsplit(" ", 1)[0] + "…"
+        sentences.append(sentence)
+    return sentences
+
+
+def bm25_scores(query: set, documents: list[list[str]]) -> list[float]:
+    """Score BM25 de chaque document (liste de mots) pour les mots de la requête."""
+    n = len(documents)
+    if not n or not query:
+        return [0.0] * n
+
+    avg_length = sum(len(d) for d in documents) / n or 1.0
+    df = Counter(term for d in documents for term in set(d) if term in query)
+    idf = {term: math.log(1 + (n - f + 0.5) / (f + 0.5)) for term, f in df.items()}
+
+    scores = []
+    for d in documents:
+        tf = Counter(term for term in d if term in idf)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(d) / avg_length)
+        scores.append(sum(idf[t] * f * (BM25_K1 + 1) / (f + norm) for t, f in tf.items()))
+    return scores
+
+
+def build_context(question: str, search_data: dict, token_budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """Meilleures phrases des résultats de recherche, dans la limite de `token_budget`."""
+    if not search_data or "results" not in search_data:
+        return NO_RESULTS
+
+    # ---- Phrases candidates : (indice résultat, position, texte)
+    candidates = []
+    titles = []
+    for rank, r in enumerate(search_data["results"]):
+        titles.append(r.get("title", ""))
+        content = r.get("content") or r.get("snippet", "")
+        for position, sentence in enumerate(split_sentences(content)):
+            candidates.append((rank, position, sentence))
+
+    if not candidates:
+        return NOT_ENOUGH
+
+    tokens = [tokenize(sentence) for _, _, sentence in candidates]
+    scores = bm25_scores(set(tokenize(question)), tokens)
+    scored = [
+        (score / (1 + RANK_DECAY * candidate[0]), i)
+        for i, (candidate, score) in enumerate(zip(candidates, scores))
+    ]
+
+    # Aucune phrase ne parle de la question : on garde l'ordre du fournisseur
+    if not any(score for score, _ in scored):
+        order = range(len(candidates))
+    else:
+        order = [i for score, i in sorted(scored, key=lambda s: (-s[0], s[1])) if score > 0]
+
+    # ---- Sélection : budget de tokens + quasi-doublons écartés
+    selected = []
+    kept_tokens = []
+    used = 0
+    for i in order:
+        rank, _, sentence = candidates[i]
+        cost = estimate_tokens(sentence)
+        if used + cost > token_budget:
+            continue
+
+        words = frozenset(tokens[i])
+        if any(jaccard(words, other) >= CONTEXT_DUP_THRESHOLD for other in kept_tokens):
+            continue
+
+        selected.append(i)
+        kept_tokens.append(words)
+        used += cost
+
+    if not selected:
+        return NOT_ENOUGH
+
+    # ---- Regroupe par résultat (meilleur d'abord), phrases dans l'ordre du texte
+    by_result = {}
+    for i in selected:
+        by_result.setdefault(candidates[i][0], []).append(i)
+
+    blocks = []
+    for rank, indices in by_result.items():
+        text = " ".join(candidates[i][2] for i in sorted(indices, key=lambda i: candidates[i][1]))
+        blocks.append(f"Titre: {titles[rank]}\nExtrait: {text}\n---")
+
+    return "\n".join(blocks)
@@ -0,0 +1,58 @@
+import asyncio
+import os
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Optional
+
+# =========================
+# ⏱️ BUDGET DE TEMPS PAR REQUÊTE
+# =========================
+# Chaque requête BlackAI reçoit une échéance (BLACKAI_DEADLINE secondes).
+# Elle est portée par une ContextVar : les tâches créées pendant la
+# requête (single-flight, course des IA) en héritent sans paramètre.
+# Chaque étape prend une part du temps restant et est annulée au-delà.
+
+BLACKAI_DEADLINE = float(os.getenv("BLACKAI_DEADLINE", 12.0))
+SEARCH_SHARE = float(os.getenv("BLACKAI_SEARCH_SHARE", 0.4))  # part du restant pour la recherche
+SEARCH_MAX_SECONDS = float(os.getenv("BLACKAI_SEARCH_MAX_SECONDS", 5.0))
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def budget(self, share: float = 1.0, cap: float = None) -> float:
+        """Part `share` du temps restant, plafonnée à `cap` secondes."""
+        seconds = self.remaining() * share
+        return min(seconds, cap) if cap is not None else seconds
+
+
+_deadline: ContextVar[Optional[Deadline]] = ContextVar("blackai_deadline", default=None)
+
+
+def start_deadline(seconds: float = BLACKAI_DEADLINE) -> Deadline:
+    deadline = Deadline(seconds)
+    _deadline.set(deadline)
+    return deadline
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _deadline.get()
+
+
+async def within(awaitable: Awaitable, share: float = 1.0, cap: float = None):
+    """
+    Attend `awaitable` dans sa part du budget courant (sans échéance :
+    attente normale). Au-delà, l'étape est annulée et TimeoutError levée.
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return await awaitable
+    return await asyncio.wait_for(awaitable, deadline.budget(share, cap))
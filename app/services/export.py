@@ -0,0 +1,96 @@
+# app/services/export.py
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import Table
+from sqlalchemy.future import select
+
+from app.database import AsyncSessionLocal
+from app.models import Deposit, Withdrawal, TransactionHistory
+
+# ============================================================
+# 📤 Exports comptables en flux
+# ============================================================
+# Les lignes sont lues via un curseur serveur par paquets de
+# FETCH_SIZE et encodées au fil de l'eau : la mémoire reste
+# constante et les premiers octets partent immédiatement.
+
+FETCH_SIZE = 5000
+
+EXPORT_TABLES: dict[str, Table] = {
+    "transaction_history": TransactionHistory.__table__,
+    "deposits": Deposit.__table__,
+    "withdrawals": Withdrawal.__table__,
+}
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _encode_csv(rows, columns, include_header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if include_header:
+        writer.writerow(columns)
+    writer.writerows([_encode_value(v) for v in row] for row in rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _encode_ndjson(rows, columns) -> bytes:
+    return "".join(
+        json.dumps(dict(zip(columns, map(_encode_value, row))), ensure_ascii=False, default=str) + "\n"
+        for row in rows
+    ).encode("utf-8")
+
+
+async def stream_export(
+    dataset: str,
+    fmt: str = "csv",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    status: Optional[str] = None,
+    compress: bool = False,
+) -> AsyncIterator[bytes]:
+    """Produit l'export d'une table (CSV ou NDJSON, gzip en option) par morceaux."""
+    table = EXPORT_TABLES[dataset]
+    columns = [c.name for c in table.columns]
+
+    query = select(table).order_by(table.c.created_at, table.c.id)
+    if start:
+        query = query.where(table.c.created_at >= start)
+    if end:
+        query = query.where(table.c.created_at < end)
+    if status:
+        query = query.where(table.c.status == status)
+
+    compressor = zlib.compressobj(wbits=31) if compress else None  # 31 → format gzip
+
+    # Session propre au flux : elle vit aussi longtemps que la réponse
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(query.execution_options(yield_per=FETCH_SIZE))
+
+        if fmt == "csv":
+            # En-tête envoyée tout de suite, même si l'export est vide
+            chunk = _encode_csv([], columns, include_header=True)
+            yield compressor.compress(chunk) if compressor else chunk
+
+        async for rows in result.partitions(FETCH_SIZE):
+            if fmt == "csv":
+                chunk = _encode_csv(rows, columns, include_header=False)
+            else:
+                chunk = _encode_ndjson(rows, columns)
+
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+
+    if compressor:
+        yield compressor.flush()
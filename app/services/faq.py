@@ -0,0 +1,256 @@
+import math
+import os
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+
+from app.services.method_catalog import current_catalog
+from app.services.text import tokenize
+
+# =========================
+# 📚 FAQ LOCALE (BM25)
+# =========================
+# Les questions sur BlackCoin (dépôts, retraits, méthodes, packs) sont
+# résolues en mémoire, sans Tavily ni IA :
+# - correspondance sûre → réponse directe
+# - correspondance partielle → passages injectés dans le prompt
+# L'index est reconstruit quand la version du catalogue des méthodes change.
+
+FAQ_TOP_K = int(os.getenv("BLACKAI_FAQ_TOP_K", 3))
+FAQ_DIRECT_COVERAGE = float(os.getenv("BLACKAI_FAQ_DIRECT_COVERAGE", 0.8))
+FAQ_DIRECT_MARGIN = float(os.getenv("BLACKAI_FAQ_DIRECT_MARGIN", 1.15))
+FAQ_CONTEXT_COVERAGE = float(os.getenv("BLACKAI_FAQ_CONTEXT_COVERAGE", 0.3))
+FAQ_LOCAL_ONLY_COVERAGE = float(os.getenv("BLACKAI_FAQ_LOCAL_ONLY_COVERAGE", 0.6))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TYPE_LABELS = {"deposit": "dépôt", "withdrawal": "retrait"}
+
+
+# =========================
+# 📝 CORPUS
+# =========================
+# Uniquement ce que le code applique réellement (routes deposits / withdrawals).
+FAQ_ENTRIES = [
+    {
+        "id": "deposit-how",
+        "title": "Comment faire un dépôt ?",
+        "keywords": "deposer recharger alimenter compte envoyer argent",
+        "answer": (
+            "💰 Pour faire un dépôt :\n"
+            "1. Choisis une méthode de dépôt de ton pays\n"
+            "2. Envoie le montant au numéro indiqué pour cette méthode\n"
+            "3. Déclare le dépôt avec l'ID de transaction reçu de l'opérateur\n\n"
+            "Le dépôt reste « en attente » jusqu'à sa validation, puis ton compte réel est crédité."
+        ),
+    },
+    {
+        "id": "deposit-status",
+        "title": "Mon dépôt est en attente, quand sera-t-il crédité ?",
+        "keywords": "depot attente pending valide validation credite solde statut quand",
+        "answer": (
+            "⏳ Chaque dépôt est vérifié puis validé par un validateur.\n"
+            "- En attente : pas encore traité\n"
+            "- Validé : le montant est ajouté à ton compte réel\n"
+            "- Rejeté : aucun crédit n'est effectué"
+        ),
+    },
+    {
+        "id": "deposit-transaction-id",
+        "title": "Cet ID de transaction existe déjà",
+        "keywords": "id transaction existe deja reference doublon utilise erreur depot",
+        "answer": (
+            "🔁 Un ID de transaction ne peut être déclaré qu'une seule fois.\n"
+            "Si tu renvoies le même dépôt, tu retrouves simplement ta déclaration d'origine. "
+            "Si l'ID appartient à un autre compte, le dépôt est refusé : vérifie l'ID reçu de l'opérateur."
+        ),
+    },
+    {
+        "id": "withdrawal-how",
+        "title": "Comment faire un retrait ?",
+        "keywords": "retirer retrait sortir argent encaisser adresse",
+        "answer": (
+            "💸 Pour faire un retrait :\n"
+            "1. Choisis une méthode de retrait\n"
+            "2. Indique l'adresse de réception (numéro mobile money, compte, IBAN ou adresse crypto)\n"
+            "3. Saisis un montant inférieur ou égal à ton solde réel\n\n"
+            "Conditions : un pack actif et un solde réel suffisant. "
+            "Le retrait reste « en attente » jusqu'à sa validation."
+        ),
+    },
+    {
+        "id": "withdrawal-refused",
+        "title": "Pourquoi mon retrait est-il refusé ?",
+        "keywords": "retrait refuse impossible erreur fonds insuffisants aucun pack actif methode invalide pourquoi",
+        "answer": (
+            "❌ Un retrait est refusé si :\n"
+            "- ton solde réel est inférieur au montant demandé (« Fonds insuffisants »)\n"
+            "- tu n'as aucun pack actif\n"
+            "- la méthode choisie n'est pas une méthode de retrait\n"
+            "Un retrait peut aussi être rejeté par le validateur : ton solde n'est alors pas débité."
+        ),
+    },
+    {
+        "id": "withdrawal-debit",
+        "title": "Quand mon solde est-il débité pour un retrait ?",
+        "keywords": "solde debite retrait quand argent retire validation attente",
+        "answer": (
+            "🏦 Ton solde réel est débité au moment où le retrait est validé, pas à la demande. "
+            "Un retrait rejeté ne débite rien."
+        ),
+    },
+    {
+        "id": "pack-required",
+        "title": "Faut-il un pack pour retirer ?",
+        "keywords": "pack actif acheter obligatoire necessaire retrait condition",
+        "answer": "📦 Oui : un pack actif est nécessaire pour demander un retrait.",
+    },
+    {
+        "id": "history",
+        "title": "Où voir l'historique de mes transactions ?",
+        "keywords": "historique transactions liste depots retraits credits voir consulter",
+        "answer": (
+            "📜 Ton historique regroupe tes dépôts, tes retraits et les crédits reçus, "
+            "du plus récent au plus ancien, avec leur statut."
+        ),
+    },
+]
+
+
+@dataclass(frozen=True)
+class Passage:
+    id: str
+    title: str
+    text: str
+    answer: str
+
+
+@dataclass(frozen=True)
+class FaqMatch:
+    passage: Passage
+    score: float
+    coverage: float   # part (pondérée idf) des mots de la question retrouvés
+
+
+def _terms(text: str) -> list[str]:
+    # Pluriels simples : "depots" → "depot", "retraits" → "retrait"
+    return [w[:-1] if len(w) > 3 and w[-1] in "sx" else w for w in tokenize(text)]
+
+
+def _catalog_passages(catalog) -> list[Passage]:
+    """Une fiche par type et par pays à partir du catalogue des méthodes."""
+    if catalog is None:
+        return []
+
+    groups = {}
+    for method in catalog.methods:
+        groups.setdefault((method.type, method.country or "tous pays"), []).append(method)
+
+    passages = []
+    for (method_type, country), methods in sorted(groups.items()):
+        label = TYPE_LABELS.get(method_type, method_type)
+        lines = []
+        for m in methods:
+            number = m.account_number if m.account_number and m.account_number != "indisponible" else None
+            lines.append(f"- {m.name}" + (f" : {number}" if number else " (numéro indisponible pour le moment)"))
+
+        title = f"Méthodes de {label} — {country}"
+        answer = f"📱 Méthodes de {label} disponibles ({country}) :\n" + "\n".join(lines)
+        passages.append(Passage(
+            id=f"methods-{method_type}-{country}",
+            title=title,
+            text=f"{title} methode moyen paiement operateur mobile money {label} {country} "
+                 + " ".join(m.name for m in methods),
+            answer=answer,
+        ))
+
+    return passages
+
+
+# =========================
+# 🔎 INDEX BM25
+# =========================
+class FaqIndex:
+    def __init__(self, passages: list[Passage]):
+        self.passages = passages
+        self._postings = {}   # terme → [(indice passage, fréquence)]
+        self._lengths = []
+
+        for i, passage in enumerate(passages):
+            # Le titre compte double
+            terms = _terms(passage.title) * 2 + _terms(passage.text)
+            self._lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self._postings.setdefault(term, []).append((i, tf))
+
+        self._avg_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+        n = len(passages)
+        self._idf = {
+            term: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+        self._unknown_idf = math.log(1 + (n + 0.5) / 0.5)
+
+    def search(self, question: str, k: int = FAQ_TOP_K) -> list[FaqMatch]:
+        query = set(_terms(question))
+        if not query or not self.passages:
+            return []
+
+        scores = {}
+        matched = {}
+        for term in query:
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self._postings[term]:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[i] / self._avg_length)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+                matched[i] = matched.get(i, 0.0) + idf
+
+        total_idf = sum(self._idf.get(term, self._unknown_idf) for term in query)
+        best = sorted(scores, key=scores.get, reverse=True)[:k]
+        return [FaqMatch(self.passages[i], scores[i], matched[i] / total_idf) for i in best]
+
+
+_index: Optional[FaqIndex] = None
+_index_version = None
+
+
+def get_faq_index() -> FaqIndex:
+    """Index courant, reconstruit si le catalogue des méthodes a changé."""
+    global _index, _index_version
+
+    catalog = current_catalog()
+    version = catalog.version if catalog else None
+    if _index is None or version != _index_version:
+        passages = [Passage(e["id"], e["title"], e["keywords"], e["answer"]) for e in FAQ_ENTRIES]
+        _index = FaqIndex(passages + _catalog_passages(catalog))
+        _index_version = version
+    return _index
+
+
+# =========================
+# 🎯 UTILISATION DANS BLACKAI
+# =========================
+def search_faq(question: str, k: int = FAQ_TOP_K) -> list[FaqMatch]:
+    """Passages suffisamment proches de la question (meilleur d'abord)."""
+    return [m for m in get_faq_index().search(question, k) if m.coverage >= FAQ_CONTEXT_COVERAGE]
+
+
+def direct_answer(matches: list[FaqMatch]) -> Optional[str]:
+    """Réponse de la FAQ si le meilleur passage couvre la question et se détache des autres."""
+    if not matches or matches[0].coverage < FAQ_DIRECT_COVERAGE:
+        return None
+    if len(matches) > 1 and matches[0].score < FAQ_DIRECT_MARGIN * matches[1].score:
+        return None
+    return matches[0].passage.answer
+
+
+def is_local_enough(matches: list[FaqMatch]) -> bool:
+    """True si la FAQ suffit comme contexte (pas besoin de recherche web)."""
+    return bool(matches) and matches[0].coverage >= FAQ_LOCAL_ONLY_COVERAGE
+
+
+def format_passages(matches: list[FaqMatch]) -> str:
+    return "\n".join(f"Titre: {m.passage.title}\nExtrait: {m.passage.answer}\n---" for m in matches)
@@ -0,0 +1,73 @@
+import importlib.util
+import os
+from dataclasses import dataclass
+
+import httpx
+
+# =========================
+# 🌐 CLIENTS HTTP PARTAGÉS
+# =========================
+# Un client httpx par fournisseur, créé au démarrage et fermé à l'arrêt :
+# les connexions (DNS + TCP + TLS) restent ouvertes entre les requêtes.
+
+# HTTP/2 seulement si activé et si le paquet `h2` est installé
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "0") == "1" and importlib.util.find_spec("h2") is not None
+
+
+@dataclass(frozen=True)
+class ProviderConfig:
+    timeout: float
+    connect_timeout: float = 5.0
+    max_connections: int = 20
+    max_keepalive: int = 10
+    keepalive_expiry: float = 60.0
+
+
+def _config(name: str, timeout: float) -> ProviderConfig:
+    prefix = f"HTTP_{name.upper()}_"
+    return ProviderConfig(
+        timeout=float(os.getenv(prefix + "TIMEOUT", timeout)),
+        max_connections=int(os.getenv(prefix + "MAX_CONNECTIONS", 20)),
+        max_keepalive=int(os.getenv(prefix + "MAX_KEEPALIVE", 10)),
+    )
+
+
+PROVIDERS = {
+    "gemini": _config("gemini", 20),
+    "openrouter": _config("openrouter", 20),
+    "tavily": _config("tavily", 30),
+    "firecrawl": _config("firecrawl", 30),
+}
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def _build_client(config: ProviderConfig) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=HTTP2_ENABLED,
+        timeout=httpx.Timeout(config.timeout, connect=config.connect_timeout),
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+    )
+
+
+def get_client(provider: str) -> httpx.AsyncClient:
+    """Client partagé du fournisseur (créé à la demande s'il n'existe pas)."""
+    client = _clients.get(provider)
+    if client is None or client.is_closed:
+        client = _clients[provider] = _build_client(PROVIDERS[provider])
+    return client
+
+
+def open_http_clients():
+    for provider in PROVIDERS:
+        get_client(provider)
+
+
+async def close_http_clients():
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
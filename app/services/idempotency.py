@@ -0,0 +1,24 @@
+# app/services/idempotency.py
+import os
+
+from app.services.cache import TTLCache
+
+# ============================================================
+# 🔁 Cache de rejeu des requêtes idempotentes
+# ============================================================
+# Garde quelques minutes la réponse d'une création (dépôt, ...) pour
+# qu'un client qui renvoie la même requête (réseau mobile instable)
+# récupère la réponse d'origine sans nouvel aller-retour en base.
+
+REPLAY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 600))  # 🔥 10 min
+REPLAY_MAX_BYTES = int(os.getenv("IDEMPOTENCY_MAX_BYTES", 8 * 1024 * 1024))
+
+replay_cache = TTLCache("idempotency", max_bytes=REPLAY_MAX_BYTES, default_ttl=REPLAY_TTL)
+
+
+def get_replay(key: str):
+    return replay_cache.get(key)
+
+
+def store_replay(key: str, value):
+    replay_cache.set(key, value)
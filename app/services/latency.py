@@ -0,0 +1,28 @@
+from collections import deque
+from threading import Lock
+
+# =========================
+# ⏱️ FENÊTRE DE LATENCES
+# =========================
+class LatencyWindow:
+    """Garde les N dernières latences observées (secondes) et en donne les percentiles."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float):
+        """Percentile p (0-100) des latences récentes, None si aucune mesure."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+        return samples[index]
@@ -0,0 +1,189 @@
+# app/services/method_catalog.py
+import asyncio
+import hashlib
+import os
+import time
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from types import MappingProxyType
+from typing import Callable, Mapping, Optional
+
+from fastapi import Depends
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.database import get_db
+from app.models import TransactionMethod
+
+# ============================================================
+# 🗂️ Catalogue des méthodes de transaction (en mémoire)
+# ============================================================
+# Les méthodes changent quasiment jamais (seed_transaction_methods.py) :
+# on les charge une fois, on les indexe par id et par type, et les routes
+# les résolvent sans requête SQL. Le catalogue est rechargé après
+# CATALOG_TTL secondes ou après un appel à invalidate_catalog().
+# Toutes les CATALOG_POLL secondes, une sonde très légère (count, max id,
+# max created_at) compare la table à la version chargée : un reseed
+# (DELETE + INSERT) est vu par tous les workers en quelques secondes.
+# Une modification en place (UPDATE) attend le TTL ou /refresh.
+
+CATALOG_TTL = int(os.getenv("METHOD_CATALOG_TTL", 300))  # 🔥 5 min
+CATALOG_POLL = float(os.getenv("METHOD_CATALOG_POLL", 5))
+
+
+@dataclass(frozen=True)
+class MethodInfo:
+    id: int
+    name: str
+    type: str
+    country: Optional[str]
+    icon_url: Optional[str]
+    flag_url: Optional[str]
+    account_number: Optional[str]
+    created_at: Optional[datetime]
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass(frozen=True)
+class MethodCatalog:
+    methods: tuple
+    by_id: Mapping[int, MethodInfo]
+    by_type: Mapping[str, tuple]
+    version: str
+    loaded_at: float
+    # 🛰️ Résultat de la sonde base au moment du chargement (voir probe_catalog)
+    db_version: Optional[tuple] = field(default=None, compare=False)
+    # 📦 Réponses déjà sérialisées pour cette version (voir render)
+    rendered: dict = field(default_factory=dict, compare=False, repr=False)
+
+    def etag(self, name: str) -> str:
+        """ETag fort d'une représentation du catalogue."""
+        return f'"{self.version}-{name}"'
+
+    def render(self, name: str, build: Callable[[], bytes]) -> bytes:
+        """Sérialise une représentation une seule fois par version."""
+        body = self.rendered.get(name)
+        if body is None:
+            body = self.rendered[name] = build()
+        return body
+
+    def get(self, method_id: Optional[int]) -> Optional[MethodInfo]:
+        return self.by_id.get(method_id)
+
+    def name_of(self, method_id: Optional[int]) -> Optional[str]:
+        method = self.by_id.get(method_id)
+        return method.name if method else None
+
+    def of_type(self, method_type: str) -> tuple:
+        return self.by_type.get(method_type, ())
+
+
+def build_catalog(methods: list, db_version: Optional[tuple] = None) -> MethodCatalog:
+    """Construit un catalogue immuable à partir d'une liste de MethodInfo."""
+    methods = tuple(sorted(methods, key=lambda m: m.id))
+
+    by_type = {}
+    for method in methods:
+        by_type.setdefault(method.type, []).append(method)
+
+    # 🔖 Version = empreinte du contenu : change dès qu'une méthode change
+    digest = hashlib.sha1()
+    for method in methods:
+        digest.update(repr(method).encode())
+
+    return MethodCatalog(
+        methods=methods,
+        by_id=MappingProxyType({m.id: m for m in methods}),
+        by_type=MappingProxyType({t: tuple(ms) for t, ms in by_type.items()}),
+        version=digest.hexdigest()[:16],
+        loaded_at=time.monotonic(),
+        db_version=db_version,
+    )
+
+
+_catalog: Optional[MethodCatalog] = None
+_catalog_lock = asyncio.Lock()
+_checked_at = 0.0  # dernière sonde (time.monotonic)
+
+
+async def probe_catalog(db: AsyncSession) -> tuple:
+    """Version côté base : change à chaque ajout, suppression ou reseed."""
+    result = await db.execute(
+        select(
+            func.count(TransactionMethod.id),
+            func.max(TransactionMethod.id),
+            func.max(TransactionMethod.created_at),
+        )
+    )
+    return tuple(result.one())
+
+
+async def load_catalog(db: AsyncSession) -> MethodCatalog:
+    """Recharge le catalogue depuis la base."""
+    global _catalog, _checked_at
+
+    # Sonde avant lecture : une écriture concurrente déclenchera un rechargement
+    db_version = await probe_catalog(db)
+    result = await db.execute(select(TransactionMethod))
+    _catalog = build_catalog([
+        MethodInfo(
+            id=m.id,
+            name=m.name,
+            type=m.type,
+            country=m.country,
+            icon_url=m.icon_url,
+            flag_url=m.flag_url,
+            account_number=m.account_number,
+            created_at=m.created_at,
+        )
+        for m in result.scalars().all()
+    ], db_version)
+    _checked_at = time.monotonic()
+    return _catalog
+
+
+def current_catalog() -> Optional[MethodCatalog]:
+    """Catalogue actuellement en mémoire (None s'il n'a jamais été chargé)."""
+    return _catalog
+
+
+def invalidate_catalog():
+    """Force le rechargement au prochain accès."""
+    global _catalog
+    _catalog = None
+
+
+def _is_fresh(catalog: Optional[MethodCatalog]) -> bool:
+    return catalog is not None and time.monotonic() - catalog.loaded_at < CATALOG_TTL
+
+
+def _recently_checked() -> bool:
+    return time.monotonic() - _checked_at < CATALOG_POLL
+
+
+async def get_catalog(db: AsyncSession) -> MethodCatalog:
+    global _checked_at
+
+    catalog = _catalog
+    if _is_fresh(catalog) and _recently_checked():
+        return catalog
+
+    # 🔒 Une seule sonde / un seul rechargement à la fois, les autres attendent
+    async with _catalog_lock:
+        catalog = _catalog
+        if not _is_fresh(catalog):
+            return await load_catalog(db)
+        if _recently_checked():
+            return catalog
+        if await probe_catalog(db) != catalog.db_version:
+            return await load_catalog(db)
+        _checked_at = time.monotonic()
+        return catalog
+
+
+# ✅ Fournisseur de catalogue (pour FastAPI Depends)
+async def get_method_catalog(db: AsyncSession = Depends(get_db)) -> MethodCatalog:
+    return await get_catalog(db)
@@ -0,0 +1,124 @@
+import hashlib
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional
+
+from app.services.text import is_negated, tokenize
+
+# =========================
+# 🔁 QUESTIONS QUASI IDENTIQUES (SIMHASH + LSH)
+# =========================
+# Chaque question est réduite à l'ensemble de ses mots significatifs,
+# puis à une empreinte SimHash 64 bits. L'empreinte est découpée en
+# bandes de 16 bits : deux empreintes à moins de 4 bits d'écart ont
+# forcément une bande commune, donc la recherche ne compare qu'aux
+# quelques questions du même seau.
+
+SIMHASH_BITS = 64
+BANDS = 4
+BAND_BITS = SIMHASH_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+NEAR_DUP_THRESHOLD = float(os.getenv("BLACKAI_NEAR_DUP_THRESHOLD", 0.8))  # Jaccard minimal
+NEAR_DUP_MAX_DISTANCE = int(os.getenv("BLACKAI_NEAR_DUP_MAX_DISTANCE", 3))  # bits (< BANDS)
+NEAR_DUP_MAX_ENTRIES = int(os.getenv("BLACKAI_NEAR_DUP_MAX_ENTRIES", 20000))
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "big")
+
+
+def simhash(tokens: frozenset) -> int:
+    weights = [0] * SIMHASH_BITS
+    for token in tokens:
+        h = _token_hash(token)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+
+    return sum(1 << bit for bit, w in enumerate(weights) if w > 0)
+
+
+def _bands(signature: int):
+    return [(i, signature >> (i * BAND_BITS) & BAND_MASK) for i in range(BANDS)]
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class NearDuplicateIndex:
+    """Index borné (LRU) clé de cache → empreinte de la question."""
+
+    def __init__(
+        self,
+        threshold: float = NEAR_DUP_THRESHOLD,
+        max_distance: int = NEAR_DUP_MAX_DISTANCE,
+        max_entries: int = NEAR_DUP_MAX_ENTRIES,
+    ):
+        self.threshold = threshold
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # clé → (empreinte, mots)
+        self._buckets: dict[tuple, set] = {}
+        self._lock = Lock()
+
+    def add(self, key: str, text: str):
+        tokens = frozenset(tokenize(text))
+        if not tokens:
+            return
+
+        signature = simhash(tokens)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (signature, tokens)
+            for band in _bands(signature):
+                self._buckets.setdefault(band, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def find(self, text: str) -> Optional[str]:
+        """Clé de la question indexée la plus proche, si elle dépasse le seuil."""
+        tokens = frozenset(tokenize(text))
+        if not tokens:
+            return None
+
+        signature = simhash(tokens)
+        negated = is_negated(tokens)
+        best_key, best_score = None, self.threshold
+
+        with self._lock:
+            candidates = set()
+            for band in _bands(signature):
+                candidates |= self._buckets.get(band, set())
+
+            for key in candidates:
+                other_signature, other_tokens = self._entries[key]
+                if bin(signature ^ other_signature).count("1") > self.max_distance:
+                    continue
+
+                # 🚫 "n'est pas validé" ne doit jamais reprendre la réponse de "est validé"
+                if is_negated(other_tokens) != negated:
+                    continue
+
+                score = jaccard(tokens, other_tokens)
+                if score >= best_score:
+                    best_key, best_score = key, score
+
+            if best_key is not None:
+                self._entries.move_to_end(best_key)
+
+        return best_key
+
+    def _remove(self, key: str):
+        signature, _ = self._entries.pop(key)
+        for band in _bands(signature):
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
@@ -2,60 +2,89 @@ from decimal import Decimal
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import func
+from sqlalchemy import func, update
+from sqlalchemy.dialects.postgresql import insert
 from app.models import RealCash
 
+# ============================================================
+# ⚙️ Primitives de solde
+# ============================================================
+# Chaque opération tient en une seule requête atomique côté Postgres
+# et ne commit jamais : l'appelant les compose dans sa propre
+# transaction et commit une seule fois.
+
+def _credit_statement(rows: list[dict]):
+    """INSERT ... ON CONFLICT (user_id) DO UPDATE : crée ou incrémente le solde."""
+    stmt = insert(RealCash).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[RealCash.user_id],
+        set_={
+            "cash_balance": RealCash.cash_balance + stmt.excluded.cash_balance,
+            "updated_at": func.now(),
+        },
+    )
+
+
 # ============================================================
 # 🔹 Ajouter des fonds réels
 # ============================================================
-async def add_real_cash(user_id: int, amount: float, db: AsyncSession) -> RealCash:
+async def add_real_cash(user_id: int, amount: float, db: AsyncSession) -> Decimal:
+    """Crédite le compte et renvoie le nouveau solde (un aller-retour)."""
     # Conversion sûre en Decimal
     decimal_amount = Decimal(str(amount))
 
-    result = await db.execute(select(RealCash).where(RealCash.user_id == user_id))
-    real_cash = result.scalars().first()
+    result = await db.execute(
+        _credit_statement([{"user_id": user_id, "cash_balance": decimal_amount}])
+        .returning(RealCash.cash_balance)
+    )
+    return result.scalar_one()
 
-    if real_cash:
-        real_cash.cash_balance += decimal_amount
-        real_cash.updated_at = func.now()
-    else:
-        real_cash = RealCash(
-            user_id=user_id,
-            cash_balance=decimal_amount
-        )
-        db.add(real_cash)
 
-    # Commit et refresh pour s'assurer que la valeur est persistée
-    await db.commit()
-    await db.refresh(real_cash)
-    return real_cash
+# ============================================================
+# 🔹 Créditer plusieurs utilisateurs en une requête
+# ============================================================
+async def credit_real_cash_bulk(amounts: dict[int, Decimal], db: AsyncSession) -> None:
+    """Crédite `amounts[user_id]` sur chaque compte, en un seul upsert."""
+    if not amounts:
+        return
+
+    await db.execute(_credit_statement([
+        {"user_id": user_id, "cash_balance": amount}
+        for user_id, amount in sorted(amounts.items())  # ordre fixe → pas d'interblocage
+    ]))
 
 
 # ============================================================
 # 🔹 Retirer des fonds réels
 # ============================================================
-async def remove_real_cash(user_id: int, amount: float, db: AsyncSession) -> RealCash:
+async def remove_real_cash(user_id: int, amount: float, db: AsyncSession) -> Decimal:
+    """
+    Débite le compte seulement si le solde suffit (UPDATE conditionnel)
+    et renvoie le nouveau solde ; lève une 400 sinon.
+    """
     decimal_amount = Decimal(str(amount))
 
     result = await db.execute(
-        select(RealCash)
-        .where(RealCash.user_id == user_id)
-        .with_for_update()
+        update(RealCash)
+        .where(
+            RealCash.user_id == user_id,
+            RealCash.cash_balance >= decimal_amount,
+        )
+        .values(
+            cash_balance=RealCash.cash_balance - decimal_amount,
+            updated_at=func.now(),
+        )
+        .returning(RealCash.cash_balance)
     )
-    real_cash = result.scalars().first()
+    new_balance = result.scalar()
 
-    if not real_cash or real_cash.cash_balance < decimal_amount:
+    if new_balance is None:
         raise HTTPException(
             status_code=400,
             detail="Fonds réels insuffisants"
         )
 
-    real_cash.cash_balance -= decimal_amount
-    real_cash.updated_at = func.now()
-
-    await db.commit()
-    await db.refresh(real_cash)
-    return real_cash
+    return new_balance
 
 
 # ============================================================
@@ -64,4 +93,4 @@ async def remove_real_cash(user_id: int, amount: float, db: AsyncSession) -> Rea
 async def get_real_cash_balance(user_id: int, db: AsyncSession) -> float:
     result = await db.execute(select(RealCash).where(RealCash.user_id == user_id))
     real_cash = result.scalars().first()
-    return float(real_cash.cash_balance) if real_cash else 0.0
\ No newline at end of file
+    return float(real_cash.cash_balance) if real_cash else 0.0
@@ -1,68 +1,151 @@
-import httpx
+import asyncio
 import os
+import re
+import time
+
+from app.services.cache import TTLCache
+from app.services.admission import Busy, get_limiter
+from app.services.circuit_breaker import get_breaker, order_by_health
+from app.services.http_clients import get_client
 
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 FIRECRAWL_API_KEY = os.getenv("FIRECRAWL_API_KEY")
 
+# 💾 Cache des résultats de recherche (plus court que celui des réponses)
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", 60 * 30))  # 🔥 30 min
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", 8 * 1024 * 1024))  # 🔥 8 Mo
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", 8))
+SEARCH_MAX_CONTENT_CHARS = int(os.getenv("SEARCH_MAX_CONTENT_CHARS", 1500))
+
+search_cache = TTLCache("search", max_bytes=SEARCH_CACHE_MAX_BYTES, default_ttl=SEARCH_CACHE_TTL)
+
 
 async def tavily_search(query: str):
     """Recherche via Tavily API"""
-    async with httpx.AsyncClient(timeout=30) as client:
-        res = await client.post(
-            "https://api.tavily.com/search",
-            json={
-                "api_key": TAVILY_API_KEY,
-                "query": query,
-                "search_depth": "basic"
-            }
-        )
-        return res.json()
+    res = await get_client("tavily").post(
+        "https://api.tavily.com/search",
+        json={
+            "api_key": TAVILY_API_KEY,
+            "query": query,
+            "search_depth": "basic"
+        }
+    )
+    return res.json()
 
 
 async def firecrawl_search(query: str):
     """Recherche via Firecrawl API (fallback)"""
-    async with httpx.AsyncClient(timeout=30) as client:
-        res = await client.post(
-            "https://api.firecrawl.dev/search",
-            json={
-                "query": query
-            },
-            headers={
-                "Authorization": f"Bearer {FIRECRAWL_API_KEY}"
-            }
-        )
-        return res.json()
+    res = await get_client("firecrawl").post(
+        "https://api.firecrawl.dev/search",
+        json={
+            "query": query
+        },
+        headers={
+            "Authorization": f"Bearer {FIRECRAWL_API_KEY}"
+        }
+    )
+    return res.json()
+
+
+SEARCH_PROVIDERS = {
+    "tavily": tavily_search,
+    "firecrawl": firecrawl_search,
+}
+
+
+# =========================
+# 💾 CACHE DES RÉSULTATS
+# =========================
+def search_key(query: str) -> str:
+    """Clé de cache : requête en minuscules, sans ponctuation ni espaces multiples."""
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+
+def compact_results(result: dict) -> dict:
+    """Garde uniquement ce que le prompt utilise : titre, url, extrait tronqué."""
+    compact = []
+
+    for r in result.get("results") or []:
+        content = r.get("content") or r.get("snippet") or r.get("description") or ""
+        if not content:
+            continue
+
+        compact.append({
+            "title": r.get("title", ""),
+            "url": r.get("url", ""),
+            "content": content[:SEARCH_MAX_CONTENT_CHARS],
+        })
+        if len(compact) >= SEARCH_MAX_RESULTS:
+            break
+
+    return {"results": compact}
 
 
 async def search_web(query: str):
-    """Recherche web avec fallback intelligent (Tavily → Firecrawl)"""
+    """Recherche web avec cache et fallback intelligent (fournisseur le plus sain d'abord)"""
+    key = search_key(query)
+
+    cached = search_cache.get(key)
+    if cached is not None:
+        print("💾 SEARCH CACHE HIT")
+        return cached
+
+    result = await _search_providers(query)
+
+    # ❌ Les échecs ne sont pas mis en cache : on retentera au prochain appel
+    if "results" in result:
+        search_cache.set(key, result)
+
+    return result
+
+
+async def _search_providers(query: str):
     errors = []
-    
-    # Essai Tavily d'abord
-    try:
-        print("🔍 TRYING TAVILY...")
-        result = await tavily_search(query)
-        if result and "results" in result:
-            print("✅ TAVILY SUCCESS")
-            return result
-        else:
-            errors.append("Tavily: no results")
-    except Exception as e:
-        print(f"❌ TAVILY ERROR: {e}")
-        errors.append(f"Tavily: {str(e)}")
-    
-    # Fallback Firecrawl
-    try:
-        print("🔍 TRYING FIRECRAWL (fallback)...")
-        result = await firecrawl_search(query)
+
+    for name in order_by_health(list(SEARCH_PROVIDERS)):
+        breaker = get_breaker(name)
+
+        # 🔌 Fournisseur en panne récente → sauté sans attendre de timeout
+        if not breaker.allow():
+            print(f"⏭️ {name.upper()} SKIPPED (circuit ouvert)")
+            errors.append(f"{name}: circuit ouvert")
+            continue
+
+        # 🚦 Fournisseur saturé → suivant (la réponse se fera sans données web au pire)
+        limiter = get_limiter(name)
+        try:
+            await limiter.acquire()
+        except Busy as e:
+            breaker.release()
+            print(f"⏭️ {name.upper()} SKIPPED (saturé)")
+            errors.append(str(e))
+            continue
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+
+        start = time.monotonic()
+        try:
+            print(f"🔍 TRYING {name.upper()}...")
+            result = await SEARCH_PROVIDERS[name](query)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            breaker.record_failure()
+            print(f"❌ {name.upper()} ERROR: {e}")
+            errors.append(f"{name}: {str(e)}")
+            continue
+        finally:
+            limiter.release()
+
         if result and "results" in result:
-            print("✅ FIRECRAWL SUCCESS")
-            return result
-        else:
-            errors.append("Firecrawl: no results")
-    except Exception as e:
-        print(f"❌ FIRECRAWL ERROR: {e}")
-        errors.append(f"Firecrawl: {str(e)}")
-    
+            breaker.record_success(time.monotonic() - start)
+            print(f"✅ {name.upper()} SUCCESS")
+            return compact_results(result)
+
+        breaker.record_failure()
+        errors.append(f"{name}: no results")
+
     # Échec complet
-    return {"error": "search failed", "details": " | ".join(errors)}
\ No newline at end of file
+    return {"error": "search failed", "details": " | ".join(errors)}
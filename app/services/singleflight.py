@@ -0,0 +1,42 @@
+import asyncio
+from typing import Awaitable, Callable
+
+# =========================
+# 🛫 SINGLE-FLIGHT
+# =========================
+class SingleFlight:
+    """
+    Regroupe les appels concurrents identiques : le premier appel pour
+    une clé lance le travail, les suivants attendent le même résultat
+    (ou la même exception) au lieu de relancer le travail.
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        task = self._inflight.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.coalesced += 1
+
+        # 🛡️ Si le client du premier appel se déconnecte, le travail
+        # continue pour ceux qui attendent
+        return await asyncio.shield(task)
+
+    def pending(self, key: str) -> bool:
+        return key in self._inflight
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # évite "exception was never retrieved"
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), "coalesced": self.coalesced}
@@ -0,0 +1,227 @@
+# app/services/statement_import.py
+import codecs
+import csv
+import io
+import json
+import re
+from decimal import Decimal, InvalidOperation
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# ============================================================
+# 📥 Import de relevés opérateurs (MTN / Moov / Orange ...)
+# ============================================================
+# Le relevé est lu par morceaux, normalisé ligne à ligne et envoyé
+# en flux à Postgres via COPY dans une table temporaire : rien n'est
+# chargé entièrement en mémoire. Le rapprochement avec `deposits` se
+# fait ensuite en une requête qui s'appuie sur l'index unique
+# deposits.transaction_id.
+
+STAGING_TABLE = "statement_staging"
+COPY_BATCH_BYTES = 256 * 1024
+SAMPLE_SIZE = 100
+
+# Noms de colonnes acceptés dans les relevés (en minuscules)
+TRANSACTION_ID_COLUMNS = ("transaction_id", "reference", "ref", "id_transaction")
+AMOUNT_COLUMNS = ("amount", "montant")
+
+
+def detect_format(filename: Optional[str]) -> str:
+    if filename and filename.lower().endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return "csv"
+
+
+def _pick(record: dict, names: tuple) -> Optional[str]:
+    for name in names:
+        value = record.get(name)
+        if value not in (None, ""):
+            return str(value).strip()
+    return None
+
+
+_GROUPED_RE = re.compile(r"\d{1,3}(?:[.,]\d{3})+")
+
+
+def _parse_amount(raw: Optional[str]) -> Optional[Decimal]:
+    """
+    Montant d'un relevé ("1 500,00", "1.234,56", "1,234.56", "1500").
+    Les espaces sont des séparateurs de milliers. Avec "," et ".", le
+    dernier est le séparateur décimal. Un seul type de séparateur suivi
+    de 1 ou 2 chiffres est décimal, de groupes de 3 chiffres un
+    séparateur de milliers (les montants ont au plus 2 décimales).
+    Toute autre forme est ambiguë : None plutôt qu'un montant faux.
+    """
+    if raw is None:
+        return None
+
+    value = raw.replace("\u00a0", "").replace("\u202f", "").replace(" ", "")
+    sign = ""
+    if value[:1] in "+-":
+        sign, value = value[:1], value[1:]
+
+    if "," in value and "." in value:
+        decimal_sep = "," if value.rfind(",") > value.rfind(".") else "."
+        integer, _, fraction = value.rpartition(decimal_sep)
+        if not _GROUPED_RE.fullmatch(integer) or not fraction.isdigit() or len(fraction) > 2:
+            return None
+        value = f"{re.sub(r'[.,]', '', integer)}.{fraction}"
+    elif "," in value or "." in value:
+        separator = "," if "," in value else "."
+        integer, _, fraction = value.rpartition(separator)
+        if value.count(separator) == 1 and 1 <= len(fraction) <= 2 and integer.isdigit():
+            value = f"{integer}.{fraction}"
+        elif _GROUPED_RE.fullmatch(value):
+            value = value.replace(separator, "")
+        else:
+            return None
+
+    if not value.replace(".", "", 1).isdigit():
+        return None
+
+    try:
+        return Decimal(sign + value)
+    except InvalidOperation:
+        return None
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Découpe un flux d'octets en lignes texte (UTF-8, BOM toléré)."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+
+    pending += decoder.decode(b"", final=True)
+    if pending.strip():
+        yield pending.rstrip("\r")
+
+
+async def _iter_records(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Optional[dict]]:
+    """Produit un dict par ligne du relevé (None si la ligne est illisible)."""
+    header = None
+
+    async for line in _iter_lines(chunks):
+        if not line.strip():
+            continue
+
+        if fmt == "ndjson":
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield None
+                continue
+            yield {str(k).lower(): v for k, v in record.items()} if isinstance(record, dict) else None
+            continue
+
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [v.strip().lower() for v in values]
+            continue
+        yield dict(zip(header, values))
+
+
+async def _copy_source(chunks: AsyncIterator[bytes], fmt: str, stats: dict) -> AsyncIterator[bytes]:
+    """Normalise le relevé en CSV (line_no, transaction_id, amount) pour COPY."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    line_no = 0
+
+    async for record in _iter_records(chunks, fmt):
+        line_no += 1
+        transaction_id = _pick(record, TRANSACTION_ID_COLUMNS) if record else None
+        amount = _parse_amount(_pick(record, AMOUNT_COLUMNS)) if record else None
+
+        if not transaction_id or amount is None:
+            stats["invalid"] += 1
+            continue
+
+        writer.writerow((line_no, transaction_id, amount))
+        stats["rows"] += 1
+
+        if buffer.tell() >= COPY_BATCH_BYTES:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def import_statement(
+    chunks: AsyncIterator[bytes],
+    db: AsyncSession,
+    fmt: str = "csv",
+    sample_size: int = SAMPLE_SIZE,
+) -> dict:
+    """
+    Importe un relevé (CSV avec en-tête ou NDJSON) et le rapproche des dépôts.
+    Renvoie le nombre de lignes rapprochées, inconnues et en écart de montant,
+    avec un échantillon des lignes à vérifier.
+    """
+    stats = {"rows": 0, "invalid": 0}
+
+    await db.execute(text(f"""
+        CREATE TEMP TABLE {STAGING_TABLE} (
+            line_no BIGINT,
+            transaction_id TEXT NOT NULL,
+            amount NUMERIC(12, 2) NOT NULL
+        ) ON COMMIT DROP
+    """))
+
+    # ---- COPY en flux sur la connexion asyncpg de la transaction en cours
+    connection = await db.connection()
+    raw = await connection.get_raw_connection()
+    await raw.driver_connection.copy_to_table(
+        STAGING_TABLE,
+        source=_copy_source(chunks, fmt, stats),
+        columns=["line_no", "transaction_id", "amount"],
+        format="csv",
+    )
+    await db.execute(text(f"ANALYZE {STAGING_TABLE}"))
+
+    totals = (await db.execute(text(f"""
+        SELECT
+            count(*) FILTER (WHERE d.id IS NOT NULL AND d.amount = s.amount) AS matched,
+            count(*) FILTER (WHERE d.id IS NULL) AS unmatched,
+            count(*) FILTER (WHERE d.id IS NOT NULL AND d.amount <> s.amount) AS amount_mismatched
+        FROM {STAGING_TABLE} s
+        LEFT JOIN deposits d ON d.transaction_id = s.transaction_id
+    """))).one()
+
+    unmatched = (await db.execute(text(f"""
+        SELECT s.line_no, s.transaction_id, s.amount
+        FROM {STAGING_TABLE} s
+        WHERE NOT EXISTS (SELECT 1 FROM deposits d WHERE d.transaction_id = s.transaction_id)
+        ORDER BY s.line_no
+        LIMIT :limit
+    """), {"limit": sample_size})).all()
+
+    mismatched = (await db.execute(text(f"""
+        SELECT s.line_no, s.transaction_id, s.amount AS statement_amount,
+               d.id AS deposit_id, d.amount AS deposit_amount, d.status
+        FROM {STAGING_TABLE} s
+        JOIN deposits d ON d.transaction_id = s.transaction_id
+        WHERE d.amount <> s.amount
+        ORDER BY s.line_no
+        LIMIT :limit
+    """), {"limit": sample_size})).all()
+
+    # ON COMMIT DROP : la table temporaire disparaît ici
+    await db.commit()
+
+    return {
+        "rows": stats["rows"],
+        "invalid": stats["invalid"],
+        "matched": totals.matched,
+        "unmatched": totals.unmatched,
+        "amount_mismatched": totals.amount_mismatched,
+        "unmatched_sample": [dict(row._mapping) for row in unmatched],
+        "mismatched_sample": [dict(row._mapping) for row in mismatched],
+    }
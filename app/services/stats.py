@@ -0,0 +1,144 @@
+# app/services/stats.py
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import Date, cast, delete, func, literal
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.models import DailyStat, Deposit, Withdrawal, TransactionMethod
+
+# ============================================================
+# 📊 Statistiques journalières
+# ============================================================
+# `daily_stats` agrège les dépôts et retraits traités (approved /
+# rejected) par jour de création, type, méthode, pays et statut.
+# Les routes de validation/rejet l'incrémentent dans leur propre
+# transaction ; rebuild_daily_stats() le reconstruit en une passe.
+
+STAT_COLUMNS = ["day", "kind", "method_id", "country", "status", "count", "total_amount"]
+FINAL_STATUSES = ("approved", "rejected")
+
+
+def _deposit_rollup():
+    day = cast(func.date_trunc("day", Deposit.created_at), Date)
+    method_id = func.coalesce(Deposit.method_id, 0)
+    country = func.coalesce(Deposit.country, "")
+
+    return (
+        select(
+            day,
+            literal("deposit"),
+            method_id,
+            country,
+            Deposit.status,
+            func.count(),
+            func.sum(Deposit.amount),
+        )
+        .where(Deposit.status.in_(FINAL_STATUSES))
+        .group_by(day, method_id, country, Deposit.status)
+    )
+
+
+def _withdrawal_rollup():
+    day = cast(func.date_trunc("day", Withdrawal.created_at), Date)
+    method_id = func.coalesce(Withdrawal.method_id, 0)
+    # Les retraits n'ont pas de pays : on prend celui de la méthode
+    country = func.coalesce(TransactionMethod.country, "")
+
+    return (
+        select(
+            day,
+            literal("withdrawal"),
+            method_id,
+            country,
+            Withdrawal.status,
+            func.count(),
+            func.sum(Withdrawal.amount),
+        )
+        .outerjoin(TransactionMethod, Withdrawal.method_id == TransactionMethod.id)
+        .where(Withdrawal.status.in_(FINAL_STATUSES))
+        .group_by(day, method_id, country, Withdrawal.status)
+    )
+
+
+async def _upsert(rollup, db: AsyncSession):
+    stmt = insert(DailyStat).from_select(STAT_COLUMNS, rollup)
+    await db.execute(stmt.on_conflict_do_update(
+        constraint="uq_daily_stats_key",
+        set_={
+            "count": DailyStat.count + stmt.excluded.count,
+            "total_amount": DailyStat.total_amount + stmt.excluded.total_amount,
+        },
+    ))
+
+
+# ============================================================
+# 🔹 Mise à jour incrémentale (même transaction que la validation)
+# ============================================================
+async def record_deposits(deposit_ids: list[int], db: AsyncSession) -> None:
+    """Ajoute aux agrégats des dépôts qui viennent de passer approved/rejected."""
+    if deposit_ids:
+        await db.flush()
+        await _upsert(_deposit_rollup().where(Deposit.id.in_(deposit_ids)), db)
+
+
+async def record_withdrawals(withdrawal_ids: list[int], db: AsyncSession) -> None:
+    """Ajoute aux agrégats des retraits qui viennent de passer approved/rejected."""
+    if withdrawal_ids:
+        await db.flush()
+        await _upsert(_withdrawal_rollup().where(Withdrawal.id.in_(withdrawal_ids)), db)
+
+
+# ============================================================
+# 🔹 Reconstruction complète (une passe GROUP BY date_trunc)
+# ============================================================
+async def rebuild_daily_stats(db: AsyncSession) -> int:
+    await db.execute(delete(DailyStat))
+    await db.execute(insert(DailyStat).from_select(STAT_COLUMNS, _deposit_rollup()))
+    await db.execute(insert(DailyStat).from_select(STAT_COLUMNS, _withdrawal_rollup()))
+    count = (await db.execute(select(func.count()).select_from(DailyStat))).scalar_one()
+    await db.commit()
+    return count
+
+
+# ============================================================
+# 🔹 Lecture : O(jours) quel que soit le nombre de transactions
+# ============================================================
+STAT_DIMENSIONS = {
+    "day": DailyStat.day,
+    "kind": DailyStat.kind,
+    "method_id": DailyStat.method_id,
+    "country": DailyStat.country,
+    "status": DailyStat.status,
+}
+
+
+async def query_daily_stats(
+    db: AsyncSession,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    group_by: tuple = ("day", "kind", "status"),
+    kind: Optional[str] = None,
+) -> list[dict]:
+    dimensions = [STAT_DIMENSIONS[name].label(name) for name in group_by]
+
+    query = (
+        select(
+            *dimensions,
+            func.sum(DailyStat.count).label("count"),
+            func.sum(DailyStat.total_amount).label("total_amount"),
+        )
+        .group_by(*dimensions)
+        .order_by(*dimensions)
+    )
+    if start:
+        query = query.where(DailyStat.day >= start)
+    if end:
+        query = query.where(DailyStat.day <= end)
+    if kind:
+        query = query.where(DailyStat.kind == kind)
+
+    result = await db.execute(query)
+    return [dict(row._mapping) for row in result.all()]
@@ -0,0 +1,49 @@
+import re
+import unicodedata
+
+# =========================
+# 🔤 NORMALISATION LINGUISTIQUE
+# =========================
+# Mots vides FR/EN retirés avant comparaison. Les interrogatifs
+# (quoi, comment, pourquoi, combien...) et les négations sont gardés :
+# ils changent le sens de la question.
+NEGATIONS = {
+    "n", "ne", "pas", "non", "jamais", "aucun", "aucune", "rien", "plus", "personne",
+    "not", "no", "never", "nothing", "cannot",
+    "don", "doesn", "didn", "isn", "aren", "wasn", "won",  # don't, isn't... (apostrophe séparée)
+}
+
+STOPWORDS = {
+    # français
+    "a", "au", "aux", "avec", "c", "ce", "ces", "cet", "cette", "d", "dans", "de",
+    "des", "du", "elle", "en", "est", "et", "etre", "il", "ils", "j", "je", "l",
+    "la", "le", "les", "leur", "lui", "m", "ma", "mais", "me", "mes", "moi", "mon",
+    "nos", "notre", "nous", "on", "ou", "par", "pour", "qu",
+    "que", "qui", "s", "sa", "se", "ses", "si", "son", "sont", "sur", "t", "ta",
+    "te", "tes", "toi", "ton", "tu", "un", "une", "vos", "votre", "vous", "y",
+    "svp", "stp",
+    # anglais
+    "an", "and", "are", "be", "do", "does", "for", "i", "in", "is", "it", "me",
+    "my", "of", "on", "or", "please", "the", "to", "you", "your",
+}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold_accents(text: str) -> str:
+    """Minuscules sans accents : "Dépôt" → "depot"."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: str, drop_stopwords: bool = True) -> list[str]:
+    """Découpe en mots (accents repliés, apostrophes séparées, mots vides retirés)."""
+    words = _WORD_RE.findall(fold_accents(text))
+    if drop_stopwords:
+        return [w for w in words if w not in STOPWORDS]
+    return words
+
+
+def is_negated(tokens) -> bool:
+    """True si la question contient une négation ("n'est pas", "jamais", "aucun"...)."""
+    return not NEGATIONS.isdisjoint(tokens)
@@ -0,0 +1,49 @@
+# app/utils/http_cache.py
+import json
+from typing import Callable
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+# ============================================================
+# 🏷️ GET conditionnels (ETag / If-None-Match)
+# ============================================================
+
+# Les clients peuvent réutiliser leur copie 5 min, puis revalident (304)
+CATALOG_CACHE_CONTROL = "public, max-age=300, must-revalidate"
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Compare l'ETag avec l'en-tête If-None-Match (comparaison faible, RFC 9110)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def render_json(data) -> bytes:
+    return json.dumps(
+        jsonable_encoder(data), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def conditional_json_response(
+    request: Request,
+    etag: str,
+    render: Callable[[], bytes],
+    cache_control: str = CATALOG_CACHE_CONTROL,
+) -> Response:
+    """
+    Renvoie 304 sans corps si le client a déjà la bonne version,
+    sinon le JSON produit par `render` (appelé seulement dans ce cas).
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=render(), media_type="application/json", headers=headers)
@@ -0,0 +1,40 @@
+# app/utils/pagination.py
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+
+# ============================================================
+# 🔹 Curseurs de pagination (keyset)
+# ============================================================
+# Un curseur encode la clé de tri du dernier élément renvoyé
+# (created_at, puis les clés de départage comme l'id). La page
+# suivante reprend strictement après cette clé, sans OFFSET.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(created_at: datetime, *keys) -> str:
+    payload = json.dumps([created_at.isoformat(), *keys], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *key_types: type) -> tuple:
+    """
+    Décode un curseur (created_at, *clés) ; `key_types` donne le type
+    attendu de chaque clé de départage. Lève une 400 si le jeton est
+    invalide ou n'a pas la forme attendue.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, *keys = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if len(keys) != len(key_types) or not all(
+            isinstance(key, expected) and not isinstance(key, bool)
+            for key, expected in zip(keys, key_types)
+        ):
+            raise ValueError("forme de curseur inattendue")
+        return (datetime.fromisoformat(created_at), *keys)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
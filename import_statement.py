@@ -0,0 +1,44 @@
+# import_statement.py
+# Usage : python import_statement.py releve_mtn.csv [--format csv|ndjson]
+
+import argparse
+import asyncio
+import json
+
+from app.database import AsyncSessionLocal
+from app.services.statement_import import detect_format, import_statement
+
+CHUNK_SIZE = 1024 * 1024
+
+
+async def read_chunks(path: str):
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            yield chunk
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Rapproche un relevé opérateur des dépôts")
+    parser.add_argument("path", help="Fichier CSV (avec en-tête) ou NDJSON")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default=None)
+    args = parser.parse_args()
+
+    print(f"🔄 Import du relevé {args.path} ...")
+    async with AsyncSessionLocal() as session:
+        report = await import_statement(
+            read_chunks(args.path), session, fmt=args.format or detect_format(args.path)
+        )
+
+    print(f"✅ {report['rows']} lignes importées ({report['invalid']} illisibles)")
+    print(f"   rapprochées : {report['matched']}")
+    print(f"   inconnues   : {report['unmatched']}")
+    print(f"   écarts      : {report['amount_mismatched']}")
+    if report["unmatched_sample"] or report["mismatched_sample"]:
+        print(json.dumps(
+            {k: report[k] for k in ("unmatched_sample", "mismatched_sample")},
+            indent=2, ensure_ascii=False, default=str,
+        ))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,5 @@
 import os
+import asyncio
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -6,10 +7,14 @@ from dotenv import load_dotenv
 
 # --- Import interne ---
 from app.routers import methods, validator_auth, withdraw_methods
-from app.routes import deposits, withdrawals, history
-from app.database import engine
+from app.routes import deposits, withdrawals, history, admin
+from app.database import engine, AsyncSessionLocal
 from app.models import Base
+from app.migrations import upgrade_schema
 from app.routes.blackai import router as blackai_router
+from app.services.method_catalog import load_catalog
+from app.services.cache import run_cache_sweeper
+from app.services.http_clients import open_http_clients, close_http_clients
 
 # --- Charger les variables d'environnement ---
 load_dotenv()
@@ -24,6 +29,7 @@ app.include_router(methods.router)
 app.include_router(validator_auth.router)
 app.include_router(history.router)
 app.include_router(withdraw_methods.router)
+app.include_router(admin.router)
 app.include_router(blackai_router, prefix="/api")
 
 # --- 🌐 Configuration CORS ---
@@ -60,13 +66,34 @@ async def init_db():
     try:
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            await upgrade_schema(conn)
         print("✅ Base de données initialisée et tables vérifiées.")
     except Exception as e:
         print(f"❌ Erreur lors de l'initialisation de la base de données : {e}")
 
+# --- Chargement du catalogue des méthodes en mémoire ---
+async def init_method_catalog():
+    try:
+        async with AsyncSessionLocal() as session:
+            catalog = await load_catalog(session)
+        print(f"✅ Catalogue des méthodes chargé ({len(catalog.methods)} méthodes).")
+    except Exception as e:
+        print(f"❌ Erreur lors du chargement du catalogue des méthodes : {e}")
+
+background_tasks = []
+
 @app.on_event("startup")
 async def on_startup():
     await init_db()
+    await init_method_catalog()
+    open_http_clients()
+    background_tasks.append(asyncio.create_task(run_cache_sweeper()))
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    for task in background_tasks:
+        task.cancel()
+    await close_http_clients()
 
 # --- Lancement du serveur ---
 if __name__ == "__main__":
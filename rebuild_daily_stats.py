@@ -0,0 +1,14 @@
+import asyncio
+from app.database import AsyncSessionLocal
+from app.services.stats import rebuild_daily_stats
+
+
+async def main():
+    print("🔄 Reconstruction de daily_stats en cours...")
+    async with AsyncSessionLocal() as session:
+        count = await rebuild_daily_stats(session)
+    print(f"✅ daily_stats reconstruite ({count} lignes).")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -135,6 +135,8 @@ async def seed_methods(session: AsyncSession):
         session.add(TransactionMethod(**method))
 
     await session.commit()
+    # 🗂️ Les serveurs déjà lancés voient le reseed (nouveaux ids) à leur
+    # prochaine sonde, soit au plus METHOD_CATALOG_POLL secondes (5 par défaut).
     print(f"✅ {len(methods)} méthodes de retrait insérées avec succès !")
 
 